@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import users, notes, dashboard, recommendations, data
+from app.api.endpoints import users, notes, dashboard, recommendations, data, metrics
 
 api_router = APIRouter()
 api_router.include_router(users.router, tags=["users"])
@@ -9,3 +9,4 @@ api_router.include_router(
     recommendations.router, prefix="/recommendations", tags=["recommendations"]
 )
 api_router.include_router(data.router, prefix="/data", tags=["data"])
+api_router.include_router(metrics.router, tags=["metrics"])
@@ -1,13 +1,15 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from fastapi import Depends, HTTPException, status, WebSocket, WebSocketException
 from fastapi.security import OAuth2PasswordBearer, OAuth2AuthorizationCodeBearer
 from jose import jwt, JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
 from app.models.user import User
-from app.services.user_service import get_user_by_email
+from app.services import user_cache
+from app.services.user_cache import CurrentUser
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/access-token")
 
@@ -18,40 +20,63 @@ def get_db() -> Generator:
     finally:
         db.close()
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
-    credentials_exception = HTTPException(
+async def get_async_db() -> AsyncGenerator:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def get_user_id_from_token(token: str) -> int:
+    """Returns the user id in the token's subject. Raises ValueError if it is invalid."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-    except (JWTError, ValueError):
-        raise credentials_exception
-    user = db.query(User).filter(User.id == user_id).first()
+        return int(payload.get("sub"))
+    except (JWTError, TypeError) as e:
+        raise ValueError("Invalid token") from e
+
+def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> CurrentUser:
+    try:
+        user_id = get_user_id_from_token(token)
+    except ValueError:
+        raise _credentials_exception()
+    user = user_cache.get_user(db, user_id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
-async def get_current_user_websocket(websocket: WebSocket) -> User:
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> CurrentUser:
+    try:
+        user_id = get_user_id_from_token(token)
+    except ValueError:
+        raise _credentials_exception()
+    user = await user_cache.get_user_async(db, user_id)
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+async def get_current_user_websocket(websocket: WebSocket) -> CurrentUser:
     token = websocket.query_params.get("token")
     if token is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return  # Do not raise an exception
 
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-    except (JWTError, ValueError):
+        user_id = get_user_id_from_token(token)
+    except ValueError:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return  # Do not raise an exception
 
-    db = SessionLocal()
-    user = db.query(User).filter(User.id == user_id).first()
-    db.close()
+    async with AsyncSessionLocal() as db:
+        user = await user_cache.get_user_async(db, user_id)
     if user is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return  # Do not raise an exception
@@ -1,51 +1,53 @@
 # app/api/endpoints/dashboard.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, datetime, timedelta
 import pytz
 
 from app.api import deps
-from app.schemas.dashboard import DashboardData, DailyEmotionData
 from app.models.user import User
-from app.services import note_service
+from app.schemas.dashboard import DashboardData, DailyEmotionData
+from app.services.user_cache import CurrentUser
+from app.services import emotion_rollup_service
+from app.services.response_cache import conditional_json
 
 router = APIRouter()
 
 @router.get("/", response_model=DashboardData)
-def get_dashboard(
+async def get_dashboard(
     *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    request: Request,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
 ):
-    total_notes = note_service.count_notes_by_user(db, user_id=current_user.id)
+    """
+    Totals, this week's emotions and profile details for the home screen.
 
-    # Calculate the start and end dates of the current week in UTC
+    Responses carry an ETag; send it back as If-None-Match to get a 304 while
+    nothing has changed.
+    """
+    # Profile fields come from the same row as data_version so that a cached
+    # response never pairs a new version with a stale profile
+    user = await db.get(User, current_user.id)
     today = datetime.now(pytz.UTC).date()
-    start_of_week = today - timedelta(days=today.weekday())  # Monday
-    end_of_week = start_of_week + timedelta(days=6)  # Sunday
+    key = ("dashboard", user.id, user.data_version, today.isoformat())
+    return await conditional_json(request, key, lambda: _build_dashboard(db, user, today))
 
-    # Adjust end_of_week to include the entire day by adding one day
-    adjusted_end_of_week = datetime.combine(end_of_week, datetime.min.time()).replace(tzinfo=pytz.UTC) + timedelta(days=1)
+async def _build_dashboard(db: AsyncSession, current_user: User, today: date) -> DashboardData:
+    total_notes = await emotion_rollup_service.count_notes(db, user_id=current_user.id)
 
-    # Convert start_of_week to datetime in UTC
-    start_of_week_datetime = datetime.combine(start_of_week, datetime.min.time()).replace(tzinfo=pytz.UTC)
+    # Calculate the start and end dates of the current week in UTC
+    start_of_week = today - timedelta(days=today.weekday())  # Monday
+    end_of_week = start_of_week + timedelta(days=6)  # Sunday
 
-    # Fetch notes for the current week using the adjusted end date
-    notes = note_service.get_notes_by_user_and_date(
+    # Fetch the daily rollups for the current week
+    rollups = await emotion_rollup_service.get_daily_rollups(
         db,
         user_id=current_user.id,
-        start_date=start_of_week_datetime,
-        end_date=adjusted_end_of_week
+        start_day=start_of_week,
+        end_day=end_of_week,
     )
 
-    # Initialize emotion counts
-    total_emotion_counts = {
-        "happy": 0,
-        "calm": 0,
-        "sad": 0,
-        "upset": 0,
-    }
-
     # Prepare daily emotion data
     daily_emotion_data = {}
     for i in range(7):
@@ -58,19 +60,15 @@ def get_dashboard(
             "upset": 0,
         }
 
-    # Aggregate emotion counts
-    for note in notes:
-        note_date_str = note.created_at.date().isoformat()
-        if note_date_str in daily_emotion_data:
-            daily_emotion_data[note_date_str]["happy"] += note.happy_count
-            daily_emotion_data[note_date_str]["calm"] += note.calm_count
-            daily_emotion_data[note_date_str]["sad"] += note.sad_count
-            daily_emotion_data[note_date_str]["upset"] += note.upset_count
+    for rollup in rollups:
+        daily_emotion_data[rollup.day.isoformat()] = {
+            "happy": rollup.happy_count,
+            "calm": rollup.calm_count,
+            "sad": rollup.sad_count,
+            "upset": rollup.upset_count,
+        }
 
-            total_emotion_counts["happy"] += note.happy_count
-            total_emotion_counts["calm"] += note.calm_count
-            total_emotion_counts["sad"] += note.sad_count
-            total_emotion_counts["upset"] += note.upset_count
+    total_emotion_counts = emotion_rollup_service.sum_counts(rollups)
 
     # Prepare weekly emotion data for the graph
     weekly_emotion_data = []
@@ -89,6 +87,7 @@ def get_dashboard(
     return DashboardData(
         name=current_user.name,
         profile_photo_url=current_user.profile_photo_url,
+        profile_thumbnail_url=current_user.profile_thumbnail_url,
         total_notes=total_notes,
         emotion_counts=total_emotion_counts,
         weekly_emotion_data=weekly_emotion_data,
@@ -1,26 +1,98 @@
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterable, AsyncIterator, Literal
 import csv
 import io
+import orjson
+import zlib
 
 from app.api import deps
-from app.models.user import User
+from app.db.session import AsyncSessionLocal
+from app.models.note import Note
+from app.services.user_cache import CurrentUser
 from app.services import note_service
 
 router = APIRouter()
 
+EXPORT_COLUMNS = [
+    Note.id,
+    Note.text,
+    Note.created_at,
+    Note.happy_count,
+    Note.calm_count,
+    Note.sad_count,
+    Note.upset_count,
+]
+EXPORT_HEADER = [column.key for column in EXPORT_COLUMNS]
+
+# Rows serialized per chunk handed to the response
+CHUNK_ROWS = 500
+
+async def _iter_rows(user_id: int) -> AsyncIterator[tuple]:
+    # The request's session is closed before a streamed body is consumed,
+    # so the export holds its own session for the lifetime of the stream.
+    async with AsyncSessionLocal() as db:
+        async for row in note_service.iter_note_rows(
+            db, user_id=user_id, columns=EXPORT_COLUMNS, batch_size=CHUNK_ROWS
+        ):
+            yield row
+
+async def _csv_chunks(rows: AsyncIterable[tuple]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+    i = 0
+    async for row in rows:
+        writer.writerow(row)
+        i += 1
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def _ndjson_chunks(rows: AsyncIterable[tuple]) -> AsyncIterator[str]:
+    lines = []
+    async for row in rows:
+        lines.append(orjson.dumps(dict(zip(EXPORT_HEADER, row))))
+        if len(lines) == CHUNK_ROWS:
+            yield (b"\n".join(lines) + b"\n").decode()
+            lines = []
+    if lines:
+        yield (b"\n".join(lines) + b"\n").decode()
+
+async def _gzip_chunks(chunks: AsyncIterable[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
 @router.get("/export", summary="Export user data")
-def export_data(
+async def export_data(
     *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
+    format: Literal["csv", "ndjson"] = "csv",
+    compress: bool = False,
 ):
-    notes = note_service.get_notes_by_user(db, user_id=current_user.id)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["id", "text", "created_at"])
-    for note in notes:
-        writer.writerow([note.id, note.text, note.created_at])
-    response = Response(content=output.getvalue(), media_type="text/csv")
-    response.headers["Content-Disposition"] = "attachment; filename=notes.csv"
-    return response
+    """
+    Streams all of the user's notes with their emotion counts.
+
+    - **format**: `csv` (default) or `ndjson`, one JSON object per line.
+    - **compress**: gzip the stream on the fly and download a `.gz` file.
+    """
+    rows = _iter_rows(current_user.id)
+    if format == "ndjson":
+        body, media_type, filename = _ndjson_chunks(rows), "application/x-ndjson", "notes.ndjson"
+    else:
+        body, media_type, filename = _csv_chunks(rows), "text/csv", "notes.csv"
+
+    if compress:
+        body, media_type, filename = _gzip_chunks(body), "application/gzip", filename + ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -1,73 +1,159 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
 from datetime import datetime, date, timedelta
+import pytz
 
 from app import schemas
+from app.core.config import settings
+from app.core.responses import ORJSONResponse, rows_to_dicts
 from app.api import deps
-from app.services import note_service
-from app.models.user import User
-from app.models.note import Note
+from app.services import note_service, emotion_rollup_service, trend_service, user_service
+from app.services.response_cache import conditional_json
+from app.services.user_cache import CurrentUser
 
 router = APIRouter()
 
-@router.get("/", response_model=List[schemas.Note])
-def read_notes(
+@router.get("/", response_model=schemas.NotePage)
+async def read_notes(
     *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "desc",
 ):
-    notes = note_service.get_notes_by_user_and_date(
-        db, user_id=current_user.id, start_date=start_date, end_date=end_date
-    )
-    return notes
+    """
+    List the user's notes a page at a time, newest first by default.
+
+    Pass the returned **next_cursor** back as **cursor** to fetch the next page.
+    """
+    try:
+        notes, next_cursor = await note_service.get_notes_page(
+            db,
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit,
+            cursor=cursor,
+            descending=order == "desc",
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Rows already match schemas.Note, so skip per-row validation
+    return ORJSONResponse({
+        "items": rows_to_dicts(notes, note_service.NOTE_KEYS),
+        "next_cursor": next_cursor,
+    })
+
+@router.get("/search", response_model=schemas.NoteSearchPage)
+async def search_notes(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
+    q: str = Query(..., min_length=1, max_length=200),
+    emotion: Optional[Literal["happy", "calm", "sad", "upset"]] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """
+    Full-text search over the user's notes, best matches first.
+
+    - **emotion**: only notes with at least one keyword of this emotion.
+    - Pass the returned **next_cursor** back as **cursor** for the next page.
+    """
+    try:
+        rows, next_cursor = await note_service.search_notes(
+            db,
+            user_id=current_user.id,
+            query=q,
+            emotion=emotion,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "items": [
+            {"note": note, "rank": rank, "highlight": highlight}
+            for note, rank, highlight in rows
+        ],
+        "next_cursor": next_cursor,
+    }
 
 @router.post("/", response_model=schemas.Note)
-def create_note(
+async def create_note(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     note_in: schemas.NoteCreate,
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
 ):
-    note = note_service.create_user_note(db, note_in, current_user.id)
+    note = await note_service.create_user_note(db, note_in, current_user.id)
     return note
 
+@router.post("/bulk", response_model=schemas.BulkNoteResponse)
+async def create_notes_bulk(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    notes_in: schemas.BulkNoteCreate,
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
+):
+    """
+    Create many notes at once, e.g. when syncing entries written offline.
+
+    Each note may carry its client **created_at** and an **idempotency_key**;
+    resending a key returns the note already stored for it as a `duplicate`.
+    """
+    if len(notes_in.notes) > settings.NOTES_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.NOTES_BULK_MAX_ITEMS} notes per request",
+        )
+    results = await note_service.create_user_notes_bulk(db, notes_in.notes, current_user.id)
+    return {
+        "created": sum(1 for status, _ in results if status == "created"),
+        "duplicates": sum(1 for status, _ in results if status == "duplicate"),
+        "results": [
+            {"index": index, "status": status, "note": note}
+            for index, (status, note) in enumerate(results)
+        ],
+    }
+
 @router.put("/{note_id}", response_model=schemas.Note)
-def update_note(
+async def update_note(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     note_id: int,
     note_in: schemas.NoteUpdate,
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
 ):
-    note = note_service.get_note_by_id(db, note_id)
+    note = await note_service.get_note_by_id(db, note_id)
     if not note or note.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Note not found")
-    updated_note = note_service.update_user_note(db, note, note_in)
+    updated_note = await note_service.update_user_note(db, note, note_in)
     return updated_note
 
 @router.delete("/{note_id}", response_model=schemas.Note)
-def delete_note(
+async def delete_note(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     note_id: int,
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
 ):
-    note = note_service.get_note_by_id(db, note_id)
+    note = await note_service.get_note_by_id(db, note_id)
     if not note or note.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Note not found")
-    note_service.delete_user_note(db, note)
+    await note_service.delete_user_note(db, note)
     return note
 
 @router.get("/daily-analysis", response_model=schemas.DailyAnalysis)
-def get_daily_analysis(
+async def get_daily_analysis(
     *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
     analysis_date: date,
 ):
     """
@@ -76,66 +162,101 @@ def get_daily_analysis(
     start_datetime = datetime.combine(analysis_date, datetime.min.time()).replace(tzinfo=pytz.UTC)
     end_datetime = start_datetime + timedelta(days=1)
 
-    notes = db.query(Note).filter(
-         Note.user_id == current_user.id,
-         Note.created_at >= start_datetime,
-         Note.created_at < end_datetime
-     ).all()
-
-    total_counts = {
-        "happy": sum(note.happy_count for note in notes),
-        "calm": sum(note.calm_count for note in notes),
-        "sad": sum(note.sad_count for note in notes),
-        "upset": sum(note.upset_count for note in notes),
-    }
-
-    return schemas.DailyAnalysis(
-        date=analysis_date,
-        total_counts=total_counts,
-        notes=notes
+    notes = await note_service.get_note_rows_by_user_and_date(
+        db, current_user.id, start_datetime, end_datetime
     )
 
+    rollup = await emotion_rollup_service.get_day_rollup(db, current_user.id, analysis_date)
+    total_counts = emotion_rollup_service.sum_counts([rollup] if rollup else [])
+
+    return ORJSONResponse({
+        "date": analysis_date,
+        "total_counts": total_counts,
+        "notes": rows_to_dicts(notes, note_service.NOTE_KEYS),
+    })
+
+@router.get("/trends", response_model=schemas.EmotionTrends)
+async def get_emotion_trends(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
+    granularity: Literal["day", "week", "month"] = "day",
+    tz: str = "UTC",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """
+    Note and emotion totals per day, week or month of the user's own calendar.
+
+    - **tz**: IANA time zone name, e.g. `America/Mexico_City`; notes are bucketed
+      by their local date there.
+    - **start_date** / **end_date**: local dates; default to the last 30 days,
+      12 weeks or 12 months ending today.
+    """
+    try:
+        zone = pytz.timezone(tz)
+    except pytz.UnknownTimeZoneError:
+        raise HTTPException(status_code=400, detail="Unknown time zone")
+
+    if end_date is None:
+        end_date = datetime.now(zone).date()
+    if start_date is None:
+        if granularity == "day":
+            start_date = end_date - timedelta(days=29)
+        elif granularity == "week":
+            start_date = end_date - timedelta(weeks=11)
+        else:
+            months_back = end_date.year * 12 + end_date.month - 1 - 11
+            start_date = date(months_back // 12, months_back % 12 + 1, 1)
+
+    try:
+        buckets = await trend_service.get_emotion_trends(
+            db, current_user.id, granularity, tz, start_date, end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"granularity": granularity, "timezone": zone.zone, "buckets": buckets}
+
 @router.get("/emotions-summary", response_model=List[schemas.DailyEmotionSummary])
-def get_emotions_summary(
+async def get_emotions_summary(
     *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    request: Request,
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: CurrentUser = Depends(deps.get_current_user_async),
     start_date: date,
     end_date: date,
 ):
     """
     Get the prevalent emotion for each day within a date range.
+
+    Responses carry an ETag; send it back as If-None-Match to get a 304 while
+    nothing has changed.
     """
-    # Adjust end_date to include the entire day
-    end_date = end_date + timedelta(days=1)
-
-    # Query to aggregate emotion counts per day
-    emotion_summaries = db.query(
-        func.date(Note.created_at).label('date'),
-        func.sum(Note.happy_count).label('happy'),
-        func.sum(Note.calm_count).label('calm'),
-        func.sum(Note.sad_count).label('sad'),
-        func.sum(Note.upset_count).label('upset'),
-    ).filter(
-        Note.user_id == current_user.id,
-        Note.created_at >= start_date,
-        Note.created_at < end_date
-    ).group_by(
-        func.date(Note.created_at)
-    ).all()
+    version = await user_service.get_data_version(db, current_user.id)
+    key = ("emotions-summary", current_user.id, version, start_date.isoformat(), end_date.isoformat())
+    return await conditional_json(
+        request, key, lambda: _build_emotions_summary(db, current_user.id, start_date, end_date)
+    )
+
+async def _build_emotions_summary(db: AsyncSession, user_id: int, start_date: date, end_date: date):
+    rollups = await emotion_rollup_service.get_daily_rollups(
+        db, user_id=user_id, start_day=start_date, end_day=end_date
+    )
 
     # Prepare the response data
     result = []
-    for summary in emotion_summaries:
+    for rollup in rollups:
+        if rollup.note_count == 0:
+            continue
         emotions = {
-            'happy': summary.happy or 0,
-            'calm': summary.calm or 0,
-            'sad': summary.sad or 0,
-            'upset': summary.upset or 0
+            'happy': rollup.happy_count,
+            'calm': rollup.calm_count,
+            'sad': rollup.sad_count,
+            'upset': rollup.upset_count
         }
         prevalent_emotion = max(emotions, key=emotions.get)
         result.append(schemas.DailyEmotionSummary(
-            date=summary.date,
+            date=rollup.day,
             prevalent_emotion=prevalent_emotion
         ))
     return result
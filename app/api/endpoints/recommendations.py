@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.models.user import User
+from app.services.user_cache import CurrentUser
 
 router = APIRouter()
 
@@ -10,7 +10,7 @@ router = APIRouter()
 def get_recommendations(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user),
 ):
     # To do: recommendation logic
     recommendations = ["Recommendation 1", "Recommendation 2"]
@@ -1,33 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, File, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 import logging
 import secrets
 
 from app import schemas
 from app.api import deps
-from app.core.security import create_access_token, verify_password
+from app.core.security import create_access_token, verify_password_async, PasswordHasherBusy
+from app.core.google_auth import verify_google_id_token
+from app.core import s3
 from app.core.s3 import upload_file_to_s3
 from app.core.config import settings
+from app.db.session import AsyncSessionLocal
 from app.models.user import User
-from app.services.user_service import create_user, get_user_by_email, update_user_plan, update_user_profile
+from app.services.user_cache import CurrentUser
+from app.services.user_service import (
+    create_user,
+    get_user_by_email,
+    update_user_password_hash,
+    update_user_plan,
+    update_user_profile,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in requests in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post(
     "/register",
     response_model=schemas.User,
     summary="Register a new user",
     description="Create a new user account by providing a valid email and password."
 )
-def register_user(
+async def register_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     user_in: schemas.UserCreate
 ):
     """
@@ -36,10 +52,13 @@ def register_user(
     - **email**: Unique email address of the user.
     - **password**: Password for the user account (will be hashed).
     """
-    user = get_user_by_email(db, email=user_in.email)
+    user = await get_user_by_email(db, email=user_in.email)
     if user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = create_user(db, user_in=user_in)
+    try:
+        user = await create_user(db, user_in=user_in)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     return user
 
 
@@ -51,10 +70,10 @@ def register_user(
     summary="Login and get access token",
     description="Authenticate a user and generate an access token using their email and password."
 )
-def login_access_token(
-    db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login_access_token(
+    db: AsyncSession = Depends(deps.get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = get_user_by_email(db, email=form_data.username)
+    user = await get_user_by_email(db, email=form_data.username)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
@@ -62,9 +81,17 @@ def login_access_token(
     if user.hashed_password == form_data.password:
         raise HTTPException(status_code=400, detail="Use Google Sign-In to authenticate")
 
-    if not verify_password(form_data.password, user.hashed_password):
+    try:
+        verified, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
+    # The stored hash predates the current cost settings; upgrade it now
+    if new_hash:
+        await update_user_password_hash(db, user, new_hash)
+
     access_token = create_access_token(subject=str(user.id))
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -77,16 +104,16 @@ def login_access_token(
     summary="Select a plan",
     description="Allows the user to select a plan: lite or plus."
 )
-def select_plan(
+async def select_plan(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     plan_in: schemas.PlanType,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: CurrentUser = Depends(deps.get_current_user_async)
 ):
 
     if plan_in not in schemas.PlanType:
         raise HTTPException(status_code=400, detail="Invalid plan type")
-    user = update_user_plan(db, user=current_user, plan=plan_in)
+    user = await update_user_plan(db, user=current_user, plan=plan_in)
     return user
 
 @router.put(
@@ -95,12 +122,12 @@ def select_plan(
     summary="Update user profile",
     description="Allows the user to update their name and upload a profile photo."
 )
-def update_profile(
+async def update_profile(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     name: str = Form(None),
     file: UploadFile = File(None),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: CurrentUser = Depends(deps.get_current_user_async)
 ):
     """
     Updates the user's profile.
@@ -114,15 +141,97 @@ def update_profile(
 
     if file:
         # Upload the file to S3
-        s3_url = upload_file_to_s3(file, settings.AWS_S3_BUCKET_NAME)
+        s3_url = await run_in_threadpool(upload_file_to_s3, file, settings.AWS_S3_BUCKET_NAME)
         update_data["profile_photo_url"] = s3_url
+        update_data["profile_thumbnail_url"] = None
 
     if update_data:
-        user = update_user_profile(db, user=current_user, update_data=update_data)
+        user = await update_user_profile(db, user=current_user, update_data=update_data)
         return user
     else:
         raise HTTPException(status_code=400, detail="No data to update")
 
+async def _generate_profile_thumbnail(user_id: int, key: str, photo_url: str):
+    try:
+        thumbnail_url = await run_in_threadpool(
+            s3.create_thumbnail, key, settings.PROFILE_THUMBNAIL_SIZE
+        )
+    except Exception as e:
+        logger.error(f"Error creating thumbnail for {key}: {e}")
+        return
+    if thumbnail_url is None:
+        return
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        # Skip if the photo was replaced while the thumbnail was being made
+        if user is not None and user.profile_photo_url == photo_url:
+            await update_user_profile(
+                db, user=user, update_data={"profile_thumbnail_url": thumbnail_url}
+            )
+
+@router.post(
+    "/profile/photo/upload-url",
+    response_model=schemas.ProfilePhotoUpload,
+    summary="Start a profile photo upload",
+    description="Returns a presigned POST for uploading a profile photo directly to S3."
+)
+async def create_profile_photo_upload(
+    *,
+    upload_in: schemas.ProfilePhotoUploadRequest,
+    current_user: CurrentUser = Depends(deps.get_current_user_async)
+):
+    """
+    Issues a presigned POST for a profile photo.
+
+    - **content_type**: MIME type of the photo; must be one of the allowed image types.
+
+    POST the file to **url** as multipart form data with **fields**, then call
+    `/profile/photo/complete` with **key**.
+    """
+    if upload_in.content_type not in settings.PROFILE_PHOTO_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported content type")
+    return await run_in_threadpool(
+        s3.generate_profile_photo_upload, current_user.id, upload_in.content_type
+    )
+
+@router.post(
+    "/profile/photo/complete",
+    response_model=schemas.User,
+    summary="Finish a profile photo upload",
+    description="Sets a photo uploaded with a presigned POST as the user's profile photo."
+)
+async def complete_profile_photo_upload(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    background_tasks: BackgroundTasks,
+    upload_in: schemas.ProfilePhotoComplete,
+    current_user: CurrentUser = Depends(deps.get_current_user_async)
+):
+    """
+    Records the uploaded photo and, if enabled, generates its thumbnail in the background.
+
+    - **key**: The key returned by `/profile/photo/upload-url`.
+    """
+    if not upload_in.key.startswith(s3.profile_photo_prefix(current_user.id)):
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    head = await run_in_threadpool(s3.head_object, upload_in.key)
+    if head is None:
+        raise HTTPException(status_code=400, detail="Upload not found")
+    if head["ContentLength"] > settings.PROFILE_PHOTO_MAX_BYTES:
+        raise HTTPException(status_code=400, detail="Photo is too large")
+
+    photo_url = s3.object_url(settings.AWS_S3_BUCKET_NAME, upload_in.key)
+    user = await update_user_profile(
+        db,
+        user=current_user,
+        update_data={"profile_photo_url": photo_url, "profile_thumbnail_url": None},
+    )
+    if settings.PROFILE_THUMBNAILS_ENABLED:
+        background_tasks.add_task(
+            _generate_profile_thumbnail, current_user.id, upload_in.key, photo_url
+        )
+    return user
+
 class GoogleAuth(BaseModel):
     id_token: str
 
@@ -132,19 +241,15 @@ class GoogleAuth(BaseModel):
     summary="Authenticate with Google",
     description="Authenticate a user using Google Sign-In and return a JWT token."
 )
-def authenticate_google(
+async def authenticate_google(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     google_auth: GoogleAuth
 ):
     logger.info("Received Google authentication request.")
     try:
-        # Verify the token with Google
-        idinfo = id_token.verify_oauth2_token(
-            google_auth.id_token,
-            google_requests.Request(),
-            settings.GOOGLE_CLIENT_ID
-        )
+        # Verify the token against the cached Google certificates
+        idinfo = await run_in_threadpool(verify_google_id_token, google_auth.id_token)
         logger.info("Google ID token verified successfully.")
 
         # Extract user information
@@ -165,7 +270,7 @@ def authenticate_google(
         raise HTTPException(status_code=500, detail="Internal server error")
 
     # Check if user exists
-    user = get_user_by_email(db, email=email)
+    user = await get_user_by_email(db, email=email)
     if user:
         logger.info(f"User with email {email} already exists.")
         is_new_user = False
@@ -179,14 +284,14 @@ def authenticate_google(
             name=name
         )
         try:
-            user = create_user(db, user_in=user_in)
-            db.commit()
-            db.refresh(user)
+            user = await create_user(db, user_in=user_in)
             logger.info(f"User {user.id} created successfully.")
             is_new_user = True
+        except PasswordHasherBusy:
+            raise _hasher_busy()
         except Exception as e:
             logger.error(f"Error creating user: {e}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=500, detail="Error creating user")
 
     # Generate JWT token
@@ -206,7 +311,7 @@ def authenticate_google(
     summary="Get current user",
     description="Retrieve the current authenticated user's information."
 )
-def read_users_me(current_user: User = Depends(deps.get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(deps.get_current_user_async)):
     """
     Retrieves the current authenticated user's information.
 
@@ -1,4 +1,6 @@
 import re
+from array import array
+from typing import Dict, Iterable, Tuple
 
 # Define keywords for each emotion
 EMOTION_KEYWORDS = {
@@ -8,18 +10,160 @@ EMOTION_KEYWORDS = {
     "upset": ["upset", "angry", "frustrated", "irritated"]
 }
 
-def analyze_text(text: str):
-    # Preprocess the text
-    text = text.lower()
-    words = re.findall(r'\b\w+\b', text)
+# Stored on every note with its counts. Bump whenever EMOTION_KEYWORDS or the
+# matching rules change, then run app/reanalyze_notes.py to re-score old notes.
+ANALYZER_VERSION = 1
+
+# Edits to texts shorter than this are simply re-scored in full
+INCREMENTAL_MIN_LENGTH = 2000
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    # Binary search on slice equality keeps the comparisons in C
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _common_suffix_length(a: str, b: str) -> int:
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+class EmotionAnalyzer:
+    """
+    Keyword analyzer compiled once from an emotion -> keywords mapping.
+
+    Only keywords are matched by the tokenizer, so the per-note cost is a
+    single regex scan plus one dict lookup per hit.
+    """
+
+    # Edits can be re-scored from the changed words alone, see reanalyze
+    supports_incremental = True
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], version: int = ANALYZER_VERSION):
+        self.version = version
+        self.emotions: Tuple[str, ...] = tuple(keywords)
+        # Keyword -> the emotions it counts for; like the legacy scan, a keyword
+        # listed under several emotions counts once for each of them
+        self._lookup: Dict[str, Tuple[int, ...]] = {}
+        for index, emotion in enumerate(self.emotions):
+            for keyword in keywords[emotion]:
+                indexes = self._lookup.get(keyword.lower(), ())
+                if index not in indexes:
+                    self._lookup[keyword.lower()] = indexes + (index,)
+        # Longest first so the alternation never stops at a shorter keyword
+        alternation = "|".join(
+            re.escape(word) for word in sorted(self._lookup, key=len, reverse=True)
+        )
+        # \b on both sides matches exactly the whole \w+ tokens of the legacy tokenizer
+        self._token_re = re.compile(rf"\b(?:{alternation})\b")
+
+    def count(self, text: str) -> array:
+        counts = array("l", [0]) * len(self.emotions)
+        lookup = self._lookup
+        for word in self._token_re.findall(text.lower()):
+            for index in lookup[word]:
+                counts[index] += 1
+        return counts
+
+    def analyze(self, text: str) -> Dict[str, int]:
+        return dict(zip(self.emotions, self.count(text)))
+
+    def reanalyze(self, old_text: str, new_text: str, old_counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Counts for ``new_text``, edited from ``old_text`` whose counts were ``old_counts``.
 
-    # Initialize counts
-    emotion_counts = {emotion: 0 for emotion in EMOTION_KEYWORDS}
+        For long texts only the changed region, widened to whole words, is
+        scored in both versions and ``old_counts`` is adjusted by the difference.
+        """
+        if len(new_text) < INCREMENTAL_MIN_LENGTH:
+            return self.analyze(new_text)
+
+        old, new = old_text.lower(), new_text.lower()
+        start = _common_prefix_length(old, new)
+        suffix = _common_suffix_length(old[start:], new[start:])
+        old_end, new_end = len(old) - suffix, len(new) - suffix
+
+        # A keyword touching the edit may have been created or broken by it
+        while start > 0 and _WORD_CHAR.match(old, start - 1):
+            start -= 1
+        while old_end < len(old) and _WORD_CHAR.match(old, old_end):
+            old_end += 1
+            new_end += 1
+
+        removed = self.count(old[start:old_end])
+        added = self.count(new[start:new_end])
+        counts = {
+            emotion: old_counts[emotion] - removed[i] + added[i]
+            for i, emotion in enumerate(self.emotions)
+        }
+        if any(count < 0 for count in counts.values()):
+            # The stored counts didn't come from old_text after all
+            return self.analyze(new_text)
+        return counts
+
+    def analyze_texts(self, texts: Iterable[str]) -> array:
+        """
+        Analyze a batch of texts.
+
+        Returns a flat row-major matrix with one row per text and one column per
+        emotion, in the order of ``self.emotions``.
+        """
+        width = len(self.emotions)
+        lookup = self._lookup
+        findall = self._token_re.findall
+        zero_row = array("l", [0]) * width
+        matrix = array("l")
+        for row, text in enumerate(texts):
+            matrix.extend(zero_row)
+            offset = row * width
+            for word in findall(text.lower()):
+                for index in lookup[word]:
+                    matrix[offset + index] += 1
+        return matrix
+
+    def rows(self, matrix: array):
+        """Yield each row of an ``analyze_texts`` matrix as an emotion -> count dict."""
+        width = len(self.emotions)
+        for offset in range(0, len(matrix), width):
+            yield dict(zip(self.emotions, matrix[offset:offset + width]))
+
+
+def build_analyzer():
+    """The engine selected by settings.EMOTION_ANALYZER."""
+    from app.core.config import settings
+
+    if settings.EMOTION_ANALYZER == "phrase":
+        from app.core.phrase_analysis import build_phrase_analyzer
+
+        return build_phrase_analyzer(
+            EMOTION_KEYWORDS,
+            negation_window=settings.EMOTION_NEGATION_WINDOW,
+            stemming=settings.EMOTION_STEMMING,
+        )
+    return EmotionAnalyzer(EMOTION_KEYWORDS)
+
+
+analyzer = build_analyzer()
+
+
+def analyze_text(text: str):
+    return analyzer.analyze(text)
 
-    # Count occurrences
-    for word in words:
-        for emotion, keywords in EMOTION_KEYWORDS.items():
-            if word in keywords:
-                emotion_counts[emotion] += 1
 
-    return emotion_counts
+def analyze_texts(texts: Iterable[str]) -> array:
+    return analyzer.analyze_texts(texts)
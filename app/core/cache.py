@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being set.
+    With ``weigher``, the summed ``weigher(key, value)`` of the entries is also
+    kept under ``maxweight`` (e.g. bytes). Keeps hit/miss/eviction counters for metrics.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        maxweight: Optional[int] = None,
+        weigher: Optional[Callable[[Hashable, Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self._weigher = weigher
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _weigh(self, key: Hashable, value: Any) -> int:
+        return self._weigher(key, value) if self._weigher is not None else 0
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._data.pop(key, _MISSING)
+        if entry is not _MISSING:
+            self.weight -= self._weigh(key, entry[1])
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        weight = self._weigh(key, value)
+        if self.maxweight is not None and weight > self.maxweight:
+            # Too big to keep; don't leave an older value behind for the key
+            self.invalidate(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (expires_at, value)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (
+                self.maxweight is not None and self.weight > self.maxweight
+            ):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def update(self, key: Hashable, function: Callable[[Any], Any]) -> bool:
+        """
+        Replace a live entry's value with ``function(value)``, keeping its expiry
+        and LRU position and without counting a hit. Returns False if there is none.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                return False
+            value = function(entry[1])
+            self.weight += self._weigh(key, value) - self._weigh(key, entry[1])
+            self._data[key] = (entry[0], value)
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,19 +1,102 @@
+from typing import List, Literal, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
 
     PROJECT_NAME: str = "NeuroType"
+    # Adds X-DB-* query stats headers to every response
+    DEBUG: bool = False
     SQLALCHEMY_DATABASE_URI: str
+    # Defaults to SQLALCHEMY_DATABASE_URI with the asyncpg/aiosqlite driver
+    SQLALCHEMY_ASYNC_DATABASE_URI: Optional[str] = None
+    # Queries slower than this are written to the app.db.slow_query log
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    # Test mode: fail any request that issues more queries than this
+    DB_QUERY_BUDGET: Optional[int] = None
+    # Bearer token a scraper must send to GET /metrics; unset, the endpoint is off
+    METRICS_TOKEN: Optional[str] = None
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ALGORITHM: str = "HS256"
 
+    # Password hashing: bcrypt cost and the dedicated executor that runs it
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hash/verify calls running or queued before new ones get a 503
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
     AWS_REGION: str = "us-east-2"
     AWS_S3_BUCKET_NAME: str
+    # Set to use an S3-compatible stand-in such as moto or MinIO
+    AWS_S3_ENDPOINT_URL: Optional[str] = None
+
+    # Direct-to-S3 profile photo uploads
+    PROFILE_PHOTO_MAX_BYTES: int = 5 * 1024 * 1024
+    PROFILE_PHOTO_CONTENT_TYPES: List[str] = ["image/jpeg", "image/png", "image/webp"]
+    PROFILE_PHOTO_UPLOAD_EXPIRES_SECONDS: int = 600
+    PROFILE_THUMBNAILS_ENABLED: bool = True
+    PROFILE_THUMBNAIL_SIZE: int = 128
 
     GOOGLE_CLIENT_ID: str
+    GOOGLE_CERTS_URL: str = "https://www.googleapis.com/oauth2/v1/certs"
+    # Least time between refetches caused by tokens with an unknown key id
+    GOOGLE_CERTS_MIN_REFRESH_SECONDS: int = 60
+
+    # Emotion analysis engine: "keyword" (single words) or "phrase" (phrases
+    # and negation). Changing these changes the stored analyzer version.
+    EMOTION_ANALYZER: Literal["keyword", "phrase"] = "keyword"
+    EMOTION_NEGATION_WINDOW: int = 3
+    # Porter stemming for the phrase engine; needs nltk
+    EMOTION_STEMMING: bool = False
+
+    # Most notes accepted by one POST /notes/bulk call
+    NOTES_BULK_MAX_ITEMS: int = 500
+
+    # Authenticated-user cache (per process)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60
+
+    # OpenAI calls: per-attempt timeout, overall deadline, retries with
+    # jittered exponential backoff, and an optional hedged second attempt
+    OPENAI_TIMEOUT_SECONDS: float = 10
+    OPENAI_DEADLINE_SECONDS: float = 25
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_RETRY_BACKOFF_SECONDS: float = 0.25
+    OPENAI_RETRY_BACKOFF_MAX_SECONDS: float = 2
+    OPENAI_HEDGE_AFTER_SECONDS: Optional[float] = None
+    # Circuit breaker (per process): consecutive failures to open it, and
+    # seconds of fast fallbacks before a probe call is let through
+    OPENAI_BREAKER_FAILURE_THRESHOLD: int = 5
+    OPENAI_BREAKER_RESET_SECONDS: float = 30
+    CHAT_FALLBACK_REPLY: str = (
+        "Sorry, I can't reply right now. Please try again in a little while."
+    )
+
+    # Chat scheduling (per process): upstream calls running at once, replies
+    # waiting for one, messages a connection may queue behind its current
+    # reply, and plus's share of slots per lite slot when both are waiting
+    CHAT_MAX_CONCURRENCY: int = 32
+    CHAT_MAX_QUEUED: int = 256
+    CHAT_MAX_PENDING_PER_CONNECTION: int = 2
+    CHAT_PLUS_WEIGHT: int = 3
+
+    # Chatbot replies reused for the same normalized message and emotion
+    # context (per process), for the plans listed
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_PLANS: List[str] = ["lite", "plus"]
+    LLM_CACHE_SIZE: int = 10000
+    LLM_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    LLM_CACHE_TTL_SECONDS: float = 3600
+
+    # Weekly emotion context for chat prompts (per process)
+    CHAT_CONTEXT_CACHE_SIZE: int = 10000
+    CHAT_CONTEXT_CACHE_TTL_SECONDS: float = 600
+
+    # Serialized dashboard/summary responses keyed by user data version (per process)
+    RESPONSE_CACHE_SIZE: int = 10000
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
 
     class Config:
         case_sensitive = True
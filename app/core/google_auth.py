@@ -0,0 +1,123 @@
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from google.auth import jwt as google_jwt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+class GoogleCertCache:
+    """
+    Process-wide cache of Google's ID token signing certificates.
+
+    Certificates are kept for the max-age Google sends in Cache-Control and
+    refreshed in a background thread shortly before they expire, so tokens are
+    verified locally without an HTTP round trip on the sign-in path.
+    """
+
+    def __init__(
+        self,
+        certs_url: str,
+        refresh_margin: float = 300,
+        default_max_age: float = 3600,
+        timeout: float = 5,
+        min_forced_refresh_interval: float = 60,
+    ):
+        self.certs_url = certs_url
+        self.refresh_margin = refresh_margin
+        self.default_max_age = default_max_age
+        self.timeout = timeout
+        self.min_forced_refresh_interval = min_forced_refresh_interval
+        # Pooled keep-alive connection to the certificate endpoint
+        self._session = requests.Session()
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        # Held for the duration of a fetch, so concurrent callers share one
+        self._fetch_lock = threading.Lock()
+        self._fetches = 0
+        self._refreshing = False
+        self._forced_at = float("-inf")
+
+    def _fetch(self):
+        response = self._session.get(self.certs_url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        certs = response.json()
+        with self._lock:
+            self._certs = certs
+            self._expires_at = time.monotonic() + max_age
+            self._fetches += 1
+        logger.info(f"Fetched {len(certs)} Google signing certificates (max-age {max_age}s).")
+        return certs
+
+    def _fetch_once(self, fetches_seen: int) -> Dict[str, str]:
+        # Single flight: whoever waited on a fetch started by another caller
+        # takes its result instead of fetching again
+        with self._fetch_lock:
+            with self._lock:
+                if self._fetches != fetches_seen:
+                    return self._certs
+            return self._fetch()
+
+    def _background_refresh(self, fetches_seen: int):
+        try:
+            self._fetch_once(fetches_seen)
+        except Exception as e:
+            # Keep serving the current certificates until they expire
+            logger.warning(f"Background refresh of Google certificates failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get_certs(self, force_refresh: bool = False) -> Dict[str, str]:
+        now = time.monotonic()
+        with self._lock:
+            certs, expires_at, fetches = self._certs, self._expires_at, self._fetches
+            stale = certs and now >= expires_at - self.refresh_margin
+            start_refresh = stale and now < expires_at and not self._refreshing and not force_refresh
+            if start_refresh:
+                self._refreshing = True
+        if force_refresh or not certs or now >= expires_at:
+            return self._fetch_once(fetches)
+        if start_refresh:
+            threading.Thread(target=self._background_refresh, args=(fetches,), daemon=True).start()
+        return certs
+
+    def _refresh_for_unknown_key(self) -> Optional[Dict[str, str]]:
+        # Tokens with made-up key ids must not turn into a fetch each
+        now = time.monotonic()
+        with self._lock:
+            if now - self._forced_at < self.min_forced_refresh_interval:
+                return None
+            self._forced_at = now
+        return self.get_certs(force_refresh=True)
+
+    def verify(self, token: str, audience: Optional[str] = None) -> dict:
+        """
+        Verifies an ID token's signature, expiry and audience and returns its
+        claims. Raises ValueError if the token is invalid.
+        """
+        certs = self.get_certs()
+        key_id = google_jwt.decode_header(token).get("kid")
+        if key_id is not None and key_id not in certs:
+            # Google rotated its keys before our copy expired, unless we
+            # refetched recently; then the key id is just unknown
+            certs = self._refresh_for_unknown_key() or certs
+        return google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=10)
+
+google_cert_cache = GoogleCertCache(
+    settings.GOOGLE_CERTS_URL,
+    min_forced_refresh_interval=settings.GOOGLE_CERTS_MIN_REFRESH_SECONDS,
+)
+
+def verify_google_id_token(token: str) -> dict:
+    return google_cert_cache.verify(token, audience=settings.GOOGLE_CLIENT_ID)
@@ -0,0 +1,329 @@
+"""
+Minimal in-process Prometheus metrics: counters, gauges and histograms with
+labels, rendered in the Prometheus text exposition format by ``/metrics``.
+
+Values are per process; with several workers, scrape each one.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Unlabelled metrics act as their own single child
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self._value = value
+
+    def get(self) -> float:
+        return self._value
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Report ``function()`` instead, for counts kept elsewhere."""
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"
+            for key, child in list(self._children.items())
+        ]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _samples(self):
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child._counts), child._sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name, documentation, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# HTTP
+HTTP_REQUEST_DURATION = histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = gauge(
+    "http_requests_in_progress", "HTTP requests currently being served."
+)
+
+# Socket.IO chat
+SOCKETIO_CONNECTIONS = gauge(
+    "socketio_connections", "Authenticated Socket.IO connections."
+)
+SOCKETIO_MESSAGE_DURATION = histogram(
+    "socketio_message_duration_seconds",
+    "Time from receiving a chat message to emitting the reply.",
+    ["outcome"],
+)
+SOCKETIO_FIRST_CHUNK_DURATION = histogram(
+    "socketio_first_chunk_duration_seconds",
+    "Time from receiving a streamed chat message to emitting its first chunk.",
+)
+CHAT_IN_FLIGHT = gauge("chat_replies_in_flight", "Chat replies holding a dispatcher slot.")
+CHAT_QUEUED = gauge("chat_replies_queued", "Chat replies waiting for a dispatcher slot.")
+CHAT_QUEUE_WAIT = histogram(
+    "chat_queue_wait_seconds", "Time chat replies waited for a dispatcher slot.", ["plan"]
+)
+CHAT_REJECTED = counter(
+    "chat_replies_rejected_total", "Chat messages answered with a busy event.", ["reason"]
+)
+LLM_CACHE_REQUESTS = counter(
+    "llm_cache_requests_total", "Chatbot reply cache lookups.", ["plan", "result"]
+)
+LLM_CACHE_BYTES = gauge("llm_cache_bytes", "Bytes held by the chatbot reply cache.")
+
+# Upstream calls
+OPENAI_REQUEST_DURATION = histogram(
+    "openai_request_duration_seconds",
+    "OpenAI chat completion latency.",
+    ["model", "outcome"],
+)
+OPENAI_TOKENS = counter(
+    "openai_tokens_total", "OpenAI tokens used.", ["model", "kind"]
+)
+OPENAI_ATTEMPTS = counter(
+    "openai_attempts_total", "OpenAI call attempts, including retries and hedges.", ["outcome"]
+)
+OPENAI_RETRIES = counter("openai_retries_total", "OpenAI calls retried, by error.", ["error"])
+OPENAI_HEDGES = counter(
+    "openai_hedged_requests_total", "Hedged OpenAI attempts launched and won.", ["result"]
+)
+OPENAI_FALLBACKS = counter(
+    "openai_fallbacks_total", "Chat replies answered with the fallback reply.", ["reason"]
+)
+OPENAI_CIRCUIT_STATE = gauge(
+    "openai_circuit_state", "OpenAI circuit breaker: 0 closed, 1 half-open, 2 open."
+)
+OPENAI_CIRCUIT_OPENED = counter("openai_circuit_opened_total", "Times the OpenAI circuit opened.")
+S3_UPLOAD_DURATION = histogram(
+    "s3_upload_duration_seconds", "Time to upload an object to S3.", ["kind"]
+)
+
+# Password hashing pool
+PASSWORD_HASH_DURATION = histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash/verify time on the password hashing pool.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PASSWORD_HASH_REJECTED = counter(
+    "password_hash_rejected_total", "Hash requests rejected because the pool was saturated."
+)
+
+# Authenticated-user cache
+USER_CACHE_HITS = counter("user_cache_hits_total", "Authenticated-user cache hits.")
+USER_CACHE_MISSES = counter("user_cache_misses_total", "Authenticated-user cache misses.")
+
+# Chat emotion context cache
+CHAT_CONTEXT_CACHE_HITS = counter("chat_context_cache_hits_total", "Chat emotion context cache hits.")
+CHAT_CONTEXT_CACHE_MISSES = counter(
+    "chat_context_cache_misses_total", "Chat emotion context cache misses."
+)
+
+# Versioned response cache
+RESPONSE_CACHE_HITS = counter("response_cache_hits_total", "Response cache hits.")
+RESPONSE_CACHE_MISSES = counter("response_cache_misses_total", "Response cache misses.")
+NOT_MODIFIED_RESPONSES = counter(
+    "not_modified_responses_total", "Requests answered 304 from If-None-Match.", ["route"]
+)
+
+def _route_template(scope) -> str:
+    route_path = getattr(scope.get("route"), "path", None)
+    if route_path is None:
+        # Raw paths would give every unknown URL its own series
+        return "unmatched"
+    # Routes of included routers may not carry their prefix, so recover it
+    # from the request path, e.g. "/notes/3" + "/{note_id}" -> "/notes/{note_id}"
+    try:
+        rendered = route_path.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return route_path
+    path = scope["path"]
+    if path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + route_path
+    return route_path
+
+class HTTPMetricsMiddleware:
+    """Observes HTTP_REQUEST_DURATION for every request, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], _route_template(scope), status["code"]
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,19 @@
+import base64
+import json
+from typing import Any, List
+
+def encode_cursor(values: List[Any]) -> str:
+    """Pack the sort key of the last row of a page into an opaque URL-safe token."""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Inverse of ``encode_cursor``. Raises ``ValueError`` for malformed tokens."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
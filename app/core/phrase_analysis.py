@@ -0,0 +1,188 @@
+import functools
+import logging
+import re
+import zlib
+from array import array
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when the lexicon, negators or matching rules below change
+PHRASE_ENGINE_VERSION = 3
+
+# Multi-word expressions on top of the single keywords
+EMOTION_PHRASES = {
+    "happy": ["over the moon", "on cloud nine", "in a good mood", "made my day", "feel great"],
+    "calm": ["at peace", "at ease", "took it easy", "deep breath", "feel rested"],
+    "sad": ["feel down", "feeling blue", "heart broken", "let down", "in tears"],
+    "upset": ["fed up", "stressed out", "lost my temper", "sick of", "pissed off"],
+}
+
+NEGATORS = {"not", "no", "never", "nor", "without", "hardly", "barely", "cannot"}
+
+# Words (with an optional apostrophe part, so "isn't" stays one token) and clause breaks
+_TOKEN_RE = re.compile(r"\w+(?:'\w+)?|[.!?;:]")
+_CLAUSE_BREAKS = frozenset(".!?;:")
+# Typographic apostrophes (phones type "isn’t") read as the ASCII one
+_APOSTROPHES = str.maketrans({"\u2019": "'", "\u2018": "'"})
+
+
+def _is_negator(token: str) -> bool:
+    return token in NEGATORS or token.endswith("n't")
+
+
+class PhraseAutomaton:
+    """
+    Aho–Corasick automaton over word tokens. ``step`` is amortised O(1), so a
+    whole note is matched in one pass that is linear in its token count.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[Tuple[str, ...], int]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Longest pattern ending at each state, as (length, values), via fail links too
+        self._best: List[Optional[Tuple[int, Tuple[int, ...]]]] = [None]
+
+        for tokens, value in patterns:
+            state = 0
+            for token in tokens:
+                next_state = self._goto[state].get(token)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[state][token] = next_state
+                state = next_state
+            # A phrase listed under several emotions counts for each of them
+            best = self._best[state]
+            if best is None:
+                self._best[state] = (len(tokens), (value,))
+            elif value not in best[1]:
+                self._best[state] = (len(tokens), best[1] + (value,))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                if self._best[child] is None:
+                    self._best[child] = self._best[self._fail[child]]
+                queue.append(child)
+
+    def step(self, state: int, token: str) -> int:
+        goto, fail = self._goto, self._fail
+        while state and token not in goto[state]:
+            state = fail[state]
+        return goto[state].get(token, 0)
+
+    def best(self, state: int) -> Optional[Tuple[int, Tuple[int, ...]]]:
+        return self._best[state]
+
+
+class PhraseAnalyzer:
+    """
+    Phrase- and negation-aware engine with the same interface as EmotionAnalyzer.
+
+    Keywords and phrases are matched as token sequences (stemmed if
+    ``stemming``); at each token the longest match ending there is counted
+    unless it overlaps the previous match. A match is dropped when a negator
+    ("not", "never", "isn't", ...) appears within ``negation_window`` tokens
+    before it in the same clause.
+    """
+
+    supports_incremental = False
+
+    def __init__(
+        self,
+        keywords: Dict[str, Iterable[str]],
+        phrases: Dict[str, Iterable[str]],
+        negation_window: int = 3,
+        stemming: bool = False,
+    ):
+        self.emotions: Tuple[str, ...] = tuple(keywords)
+        self.negation_window = negation_window
+        stem = self._load_stemmer() if stemming else None
+        self.stemming = stem is not None
+        self._stem: Callable[[str], str] = stem or (lambda token: token)
+
+        patterns = []
+        for index, emotion in enumerate(self.emotions):
+            for entry in list(keywords.get(emotion, ())) + list(phrases.get(emotion, ())):
+                entry = entry.lower().translate(_APOSTROPHES)
+                tokens = tuple(self._stem(t) for t in _TOKEN_RE.findall(entry))
+                if tokens:
+                    patterns.append((tokens, index))
+        self._automaton = PhraseAutomaton(patterns)
+
+        # Stored with each note; changes whenever the engine or its settings do
+        fingerprint = f"phrase:{PHRASE_ENGINE_VERSION}:{self.stemming}:{negation_window}"
+        self.version = zlib.crc32(fingerprint.encode()) & 0x7FFFFFFF
+
+    @staticmethod
+    def _load_stemmer():
+        try:
+            from nltk.stem import PorterStemmer
+        except ImportError:
+            logger.warning("nltk is not installed; the phrase analyzer runs without stemming.")
+            return None
+        # Notes repeat the same words a lot, and stemming is the slow part
+        return functools.lru_cache(maxsize=65536)(PorterStemmer().stem)
+
+    def count(self, text: str) -> array:
+        counts = array("l", [0]) * len(self.emotions)
+        automaton, stem = self._automaton, self._stem
+        window = self.negation_window
+        state = 0
+        position = 0
+        last_negator = -window - 1
+        last_match_end = -1
+        for match in _TOKEN_RE.finditer(text.lower().translate(_APOSTROPHES)):
+            token = match.group()
+            if token in _CLAUSE_BREAKS:
+                # Neither phrases nor negation carry across a clause break
+                state = 0
+                last_negator = -window - 1
+                continue
+            if _is_negator(token):
+                last_negator = position
+            state = automaton.step(state, stem(token))
+            best = automaton.best(state)
+            if best is not None:
+                length, emotion_indexes = best
+                start = position - length + 1
+                if start > last_match_end:
+                    last_match_end = position
+                    if start - last_negator > window:
+                        for emotion_index in emotion_indexes:
+                            counts[emotion_index] += 1
+            position += 1
+        return counts
+
+    def analyze(self, text: str) -> Dict[str, int]:
+        return dict(zip(self.emotions, self.count(text)))
+
+    def analyze_texts(self, texts: Iterable[str]) -> array:
+        matrix = array("l")
+        for text in texts:
+            matrix.extend(self.count(text))
+        return matrix
+
+    def rows(self, matrix: array):
+        width = len(self.emotions)
+        for offset in range(0, len(matrix), width):
+            yield dict(zip(self.emotions, matrix[offset:offset + width]))
+
+    def reanalyze(self, old_text: str, new_text: str, old_counts: Dict[str, int]) -> Dict[str, int]:
+        # Phrases and negation windows reach past the edited words, so re-score in full
+        return self.analyze(new_text)
+
+
+def build_phrase_analyzer(
+    keywords: Dict[str, Iterable[str]], negation_window: int = 3, stemming: bool = False
+) -> PhraseAnalyzer:
+    return PhraseAnalyzer(keywords, EMOTION_PHRASES, negation_window, stemming)
@@ -0,0 +1,17 @@
+from typing import Any, Iterable, List, Sequence
+
+import orjson
+from fastapi.responses import JSONResponse
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, which handles datetimes natively."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def rows_to_dicts(rows: Iterable[Sequence], keys: Sequence[str]) -> List[dict]:
+    """
+    Plain dicts from column-projected rows, skipping per-row model validation.
+    The query's columns must already match the response schema's fields.
+    """
+    return [dict(zip(keys, row)) for row in rows]
@@ -1,27 +1,107 @@
 import boto3
-from botocore.exceptions import NoCredentialsError
+from botocore.exceptions import ClientError, NoCredentialsError
+import io
+import logging
+import mimetypes
+import posixpath
 import uuid
 
+from app.core import metrics
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 s3_client = boto3.client(
     's3',
     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
     aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_REGION
+    region_name=settings.AWS_REGION,
+    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
 )
 
+def object_url(bucket_name, object_name):
+    if settings.AWS_S3_ENDPOINT_URL:
+        return f"{settings.AWS_S3_ENDPOINT_URL.rstrip('/')}/{bucket_name}/{object_name}"
+    return f"https://{bucket_name}.s3.amazonaws.com/{object_name}"
+
 def upload_file_to_s3(file, bucket_name, object_name=None):
     if object_name is None:
         object_name = str(uuid.uuid4())
     try:
-        s3_client.upload_fileobj(
-            file.file,
-            bucket_name,
-            object_name,
-            ExtraArgs={"ContentType": file.content_type}
-        )
-        s3_url = f"https://{bucket_name}.s3.amazonaws.com/{object_name}"
+        with metrics.S3_UPLOAD_DURATION.labels("profile_photo").time():
+            s3_client.upload_fileobj(
+                file.file,
+                bucket_name,
+                object_name,
+                ExtraArgs={"ContentType": file.content_type}
+            )
+        s3_url = object_url(bucket_name, object_name)
         return s3_url
     except NoCredentialsError:
         raise Exception("Credentials not available")
+
+def profile_photo_prefix(user_id: int) -> str:
+    return f"profile-photos/{user_id}/"
+
+def generate_profile_photo_upload(user_id: int, content_type: str, bucket_name=None):
+    """
+    Presigned POST that lets the client upload one profile photo straight to S3.
+    S3 rejects the upload unless it matches the content type and size limit.
+    """
+    bucket_name = bucket_name or settings.AWS_S3_BUCKET_NAME
+    extension = mimetypes.guess_extension(content_type) or ""
+    object_name = f"{profile_photo_prefix(user_id)}{uuid.uuid4()}{extension}"
+    post = s3_client.generate_presigned_post(
+        Bucket=bucket_name,
+        Key=object_name,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.PROFILE_PHOTO_MAX_BYTES],
+        ],
+        ExpiresIn=settings.PROFILE_PHOTO_UPLOAD_EXPIRES_SECONDS,
+    )
+    return {
+        "url": post["url"],
+        "fields": post["fields"],
+        "key": object_name,
+        "expires_in": settings.PROFILE_PHOTO_UPLOAD_EXPIRES_SECONDS,
+    }
+
+def head_object(object_name, bucket_name=None):
+    """Object metadata, or None if it does not exist."""
+    try:
+        return s3_client.head_object(Bucket=bucket_name or settings.AWS_S3_BUCKET_NAME, Key=object_name)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def create_thumbnail(object_name, size: int, bucket_name=None):
+    """
+    Stores a JPEG thumbnail that fits in ``size`` x ``size`` next to the
+    original object and returns its URL. Returns None if Pillow is not installed.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow is not installed; skipping profile photo thumbnail.")
+        return None
+
+    bucket_name = bucket_name or settings.AWS_S3_BUCKET_NAME
+    original = io.BytesIO()
+    s3_client.download_fileobj(bucket_name, object_name, original)
+    original.seek(0)
+
+    with Image.open(original) as image:
+        image.thumbnail((size, size))
+        thumbnail = io.BytesIO()
+        image.convert("RGB").save(thumbnail, format="JPEG", quality=85)
+    thumbnail.seek(0)
+
+    thumbnail_name = f"{posixpath.splitext(object_name)[0]}_{size}.jpg"
+    with metrics.S3_UPLOAD_DURATION.labels("thumbnail").time():
+        s3_client.upload_fileobj(
+            thumbnail, bucket_name, thumbnail_name, ExtraArgs={"ContentType": "image/jpeg"}
+        )
+    return object_url(bucket_name, thumbnail_name)
@@ -1,3 +1,4 @@
 from app.db.base_class import Base  # noqa
 from app.models.user import User  # noqa
 from app.models.note import Note  # noqa
+from app.models.user_daily_emotion import UserDailyEmotion  # noqa
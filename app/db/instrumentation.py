@@ -0,0 +1,136 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+slow_query_logger = logging.getLogger("app.db.slow_query")
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or block issues more queries than its budget allows."""
+
+@dataclass
+class QueryStats:
+    query_count: int = 0
+    db_seconds: float = 0.0
+    # Time spent opening new DBAPI connections; waiting on a busy pool for a
+    # checkout is not measured (SQLAlchemy has no event before a checkout)
+    connect_seconds: float = 0.0
+    budget: Optional[int] = None
+    label: Optional[str] = None
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_seconds += elapsed
+
+    if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        # Statement only; bound parameters can hold journal text
+        slow_query_logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": " ".join(statement.split())[:2000],
+            "executemany": executemany,
+            "request": stats.label if stats else None,
+        }))
+
+    if stats is not None and stats.budget is not None and stats.query_count > stats.budget:
+        raise QueryBudgetExceeded(
+            f"{stats.label or 'block'} issued {stats.query_count} queries, budget is {stats.budget}"
+        )
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so the next statement on this connection isn't timed from it
+    conn = exception_context.connection
+    if conn is None or isinstance(exception_context.original_exception, QueryBudgetExceeded):
+        # A budget failure is raised after the start time was popped
+        return
+    starts = conn.info.get("query_start_time")
+    if starts:
+        starts.pop()
+
+def _before_connect(dialect, connection_record, cargs, cparams):
+    connection_record.info["connect_start_time"] = time.perf_counter()
+
+def _on_connect(dbapi_connection, connection_record):
+    start = connection_record.info.pop("connect_start_time", None)
+    stats = _current_stats.get()
+    if start is not None and stats is not None:
+        stats.connect_seconds += time.perf_counter() - start
+
+def instrument_engine(engine: Engine):
+    """Record per-request query count, DB time and connection setup time for ``engine``."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    # Listening on the engine keeps these on the new pool after dispose()
+    event.listen(engine, "do_connect", _before_connect)
+    event.listen(engine, "connect", _on_connect)
+
+@contextmanager
+def query_budget(max_queries: int, label: Optional[str] = None):
+    """
+    Fails with QueryBudgetExceeded as soon as the enclosed block issues more
+    than ``max_queries`` queries. Yields the block's QueryStats.
+    """
+    stats = QueryStats(budget=max_queries, label=label)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+class QueryStatsMiddleware:
+    """
+    Collects QueryStats for each HTTP request. In DEBUG mode they are returned as
+    X-DB-Query-Count, X-DB-Time-Ms and X-DB-Connect-Ms response headers, and
+    DB_QUERY_BUDGET (if set) fails any request that exceeds it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(
+            budget=settings.DB_QUERY_BUDGET,
+            label=f"{scope['method']} {scope['path']}",
+        )
+        token = _current_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start" and settings.DEBUG:
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-query-count", str(stats.query_count).encode()),
+                    (b"x-db-time-ms", f"{stats.db_seconds * 1000:.2f}".encode()),
+                    (b"x-db-connect-ms", f"{stats.connect_seconds * 1000:.2f}".encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current_stats.reset(token)
@@ -1,6 +1,34 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db.instrumentation import instrument_engine
 
+# Sync engine, used by the remaining sync endpoints and the maintenance scripts
 engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_uri(uri: str) -> str:
+    """Swap the sync driver of a database URI for its asyncio counterpart."""
+    url = make_url(uri)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+# Async engine, used by request handlers and Socket.IO events
+async_engine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI
+    or async_database_uri(settings.SQLALCHEMY_DATABASE_URI)
+)
+instrument_engine(async_engine.sync_engine)
+
+# Objects stay readable after commit without an implicit (awaitable) refresh
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
@@ -3,13 +3,23 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.api import api_router
 from app.core.config import settings
-from app.models.user import User
-from app.services.chatbot_service import get_chatbot_response
+from app.core import metrics
+from app.db.instrumentation import QueryStatsMiddleware
+from app.services.chatbot_service import (
+    get_cached_response,
+    get_chatbot_response,
+    stream_chatbot_response,
+)
+from app.services import emotion_context_cache, user_cache
+from app.services.chat_dispatcher import ChatBusy, dispatcher as chat_dispatcher
 
-from jose import jwt, JWTError
-from app.db.session import SessionLocal
+from app.api.deps import get_user_id_from_token
+from app.db.session import AsyncSessionLocal
 
+import asyncio
 import logging
+import time
+import uuid
 
 logging.basicConfig(
     level=logging.INFO,
@@ -36,6 +46,8 @@ fastapi_app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+fastapi_app.add_middleware(QueryStatsMiddleware)
+fastapi_app.add_middleware(metrics.HTTPMetricsMiddleware)
 
 # Wrap the FastAPI app with Socket.IO's ASGIApp AFTER all configurations
 app = socketio.ASGIApp(sio, other_asgi_app=fastapi_app)
@@ -43,17 +55,18 @@ app = socketio.ASGIApp(sio, other_asgi_app=fastapi_app)
 # Function to authenticate user
 async def authenticate_user(sid, token):
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-    except (JWTError, ValueError):
+        user_id = get_user_id_from_token(token)
+    except ValueError:
         return None
-    db = SessionLocal()
-    user = db.query(User).filter(User.id == user_id).first()
-    db.close()
+    async with AsyncSessionLocal() as db:
+        user = await user_cache.get_user_async(db, user_id)
     return user
 
 # Dictionary to keep track of connected users
 connected_users = {}
+# Reply tasks (running or queued) for each sid
+reply_tasks = {}
+metrics.SOCKETIO_CONNECTIONS.set_function(lambda: len(connected_users))
 
 # Event handler for client connection
 @sio.event
@@ -73,6 +86,14 @@ async def connect(sid, environ):
         await sio.disconnect(sid)
         return
     connected_users[sid] = user
+    # Warm the chat context so messages don't wait on the database. Best
+    # effort: the first message loads it again if this fails.
+    try:
+        await emotion_context_cache.get_context(user.id)
+    except Exception:
+        logging.getLogger(__name__).warning(
+            f"Could not warm the chat context of user {user.id}", exc_info=True
+        )
     print(f"User {user.id} connected with SID {sid}")
 
 # Event handler for receiving messages
@@ -83,14 +104,103 @@ async def message(sid, data):
         await sio.disconnect(sid)
         return
     user_message = data.get('message')
-    if user_message:
-        # Get response from chatbot
-        response = await get_chatbot_response(user_message, user)
-        # Send response back to the client
-        await sio.emit('response', {'message': response}, room=sid)
+    if not user_message:
+        return
+    stream = bool(data.get('stream'))
+    # Streamed messages supersede this client's earlier ones unless asked to
+    # queue; plain messages wait for the replies ahead of them
+    if data.get('supersede', stream):
+        for task in reply_tasks.pop(sid, set()):
+            task.cancel()
+    reply_id = data.get('id') or uuid.uuid4().hex
+    reply = stream_reply if stream else send_reply
+    task = asyncio.ensure_future(reply(sid, reply_id, user_message, user))
+    tasks = reply_tasks.setdefault(sid, set())
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+async def send_reply(sid, reply_id, user_message, user):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        # Replies go out in message order, so even a cached one waits for
+        # the replies ahead of it; only upstream calls need a slot
+        async with chat_dispatcher.connection_turn(sid):
+            response = await get_cached_response(user_message, user)
+            if response is None:
+                async with chat_dispatcher.slot(user.id, user.plan):
+                    # Get response from chatbot
+                    response = await get_chatbot_response(user_message, user)
+            # Send response back to the client
+            await sio.emit('response', {'id': reply_id, 'message': response}, room=sid)
+        outcome = "ok"
+    except ChatBusy as exc:
+        outcome = "busy"
+        await sio.emit('busy', {'id': reply_id, 'reason': exc.reason}, room=sid)
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except Exception:
+        logging.getLogger(__name__).exception("Chat reply failed")
+    finally:
+        metrics.SOCKETIO_MESSAGE_DURATION.labels(outcome).observe(time.perf_counter() - start)
+
+async def stream_reply(sid, reply_id, user_message, user):
+    """
+    Emits the reply as ``response_chunk`` events as tokens arrive, then a
+    ``response_done`` with the full text, usage and finish reason. Cancelling
+    the task stops the upstream generation; the client is told with
+    ``finish_reason: "cancelled"`` unless it has gone. A full queue gets a
+    ``busy`` event instead.
+    """
+    start = time.perf_counter()
+    parts = []
+    usage = None
+    cached = None
+    finish_reason = "error"
+    try:
+        cached = await get_cached_response(user_message, user)
+        if cached is not None:
+            # Sent whole, without usage since no tokens were spent
+            metrics.SOCKETIO_FIRST_CHUNK_DURATION.observe(time.perf_counter() - start)
+            parts.append(cached)
+            await sio.emit('response_chunk', {'id': reply_id, 'delta': cached}, room=sid)
+            finish_reason = "stop"
+        else:
+            async with chat_dispatcher.turn(sid, user.id, user.plan):
+                stream = await stream_chatbot_response(user_message, user)
+                async for delta in stream:
+                    if not parts:
+                        metrics.SOCKETIO_FIRST_CHUNK_DURATION.observe(time.perf_counter() - start)
+                    parts.append(delta)
+                    await sio.emit('response_chunk', {'id': reply_id, 'delta': delta}, room=sid)
+            usage = stream.usage.model_dump() if stream.usage is not None else None
+            finish_reason = stream.finish_reason or "stop"
+    except ChatBusy as exc:
+        finish_reason = "busy"
+        await sio.emit('busy', {'id': reply_id, 'reason': exc.reason}, room=sid)
+    except asyncio.CancelledError:
+        finish_reason = "cancelled"
+        raise
+    except Exception:
+        logging.getLogger(__name__).exception("Streaming chat reply failed")
+    finally:
+        metrics.SOCKETIO_MESSAGE_DURATION.labels(
+            finish_reason if finish_reason in ("error", "cancelled", "busy", "fallback") else "ok"
+        ).observe(time.perf_counter() - start)
+        if sid in connected_users and finish_reason != "busy":
+            await sio.emit('response_done', {
+                'id': reply_id,
+                'message': "".join(parts).strip(),
+                'usage': usage,
+                'finish_reason': finish_reason,
+                'cached': cached is not None,
+            }, room=sid)
 
 # Event handler for client disconnection
 @sio.event
 async def disconnect(sid):
+    for task in reply_tasks.pop(sid, set()):
+        task.cancel()
     user = connected_users.pop(sid, None)
     print(f"User {user.id if user else 'Unknown'} disconnected")
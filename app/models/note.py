@@ -1,4 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import (
+    DDL, Column, DateTime, ForeignKey, Index, Integer, String, UniqueConstraint,
+    event, func, text,
+)
+from sqlalchemy.dialects import postgresql  # noqa: registers the full text search functions
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base_class import Base
@@ -6,16 +10,64 @@ import pytz
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        # Serves per-user listings ordered by (created_at, id) in either direction
+        Index("ix_notes_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Client-supplied keys make bulk sync retries safe; NULLs never collide
+        UniqueConstraint("user_id", "idempotency_key", name="uq_notes_user_id_idempotency_key"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(pytz.UTC))
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    idempotency_key = Column(String(64), nullable=True)
 
     # emotion counts
     happy_count = Column(Integer, default=0)
     calm_count = Column(Integer, default=0)
     sad_count = Column(Integer, default=0)
     upset_count = Column(Integer, default=0)
+    # ANALYZER_VERSION that produced the counts; NULL for notes older than versioning
+    analyzer_version = Column(Integer, nullable=True)
 
     user = relationship("User", back_populates="notes")
+
+
+# Full-text search. Postgres indexes user_id together with the tsvector
+# expression below in one GIN index, so a search only visits the user's own
+# notes; queries must filter on user_id and use the same expression. Indexing
+# the integer column with GIN needs the btree_gin extension (shipped with
+# Postgres contrib; creating it needs a role allowed to CREATE EXTENSION).
+SEARCH_CONFIG = text("'english'::regconfig")
+
+def search_vector(text_column):
+    return func.to_tsvector(SEARCH_CONFIG, text_column)
+
+event.listen(
+    Note.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gin").execute_if(dialect="postgresql"),
+)
+Index(
+    "ix_notes_user_id_text_search", Note.user_id, search_vector(Note.text),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+
+# SQLite (local testing) uses an external-content FTS5 table kept in sync by triggers
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "text, content='notes', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF text ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+for statement in SQLITE_FTS_DDL:
+    event.listen(Note.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(
+    Note.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS notes_fts").execute_if(dialect="sqlite"),
+)
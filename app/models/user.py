@@ -18,5 +18,11 @@ class User(Base):
     name = Column(String, nullable=True)
     plan = Column(Enum(PlanType), default=PlanType.lite)
     profile_photo_url = Column(String, nullable=True)
+    profile_thumbnail_url = Column(String, nullable=True)
+    # Bumped by every note or profile write; dashboard ETags derive from it
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     notes = relationship("Note", back_populates="user", cascade="all, delete-orphan")
+    daily_emotions = relationship(
+        "UserDailyEmotion", back_populates="user", cascade="all, delete-orphan"
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date
+from sqlalchemy.orm import relationship
+from app.db.base_class import Base
+
+class UserDailyEmotion(Base):
+    """Per-user, per-day (UTC) sums of the emotion counts of that day's notes."""
+    __tablename__ = "user_daily_emotions"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    note_count = Column(Integer, nullable=False, default=0)
+
+    # emotion counts
+    happy_count = Column(Integer, nullable=False, default=0)
+    calm_count = Column(Integer, nullable=False, default=0)
+    sad_count = Column(Integer, nullable=False, default=0)
+    upset_count = Column(Integer, nullable=False, default=0)
+
+    user = relationship("User", back_populates="daily_emotions")
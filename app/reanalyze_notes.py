@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_, select, update
+
+from app.core.analysis import analyzer, analyze_texts
+from app.db.session import SessionLocal
+from app.db import base  # noqa: registers every model
+from app.models.note import Note
+from app.models.user import User
+from app.services import emotion_rollup_service
+from app.services.emotion_rollup_service import EMOTIONS
+
+COUNT_COLUMNS = [f"{emotion}_count" for emotion in EMOTIONS]
+DEFAULT_CHECKPOINT = "reanalyze_notes.checkpoint.json"
+
+def load_checkpoint(path):
+    """Last note id written for the current analyzer version, or 0 to start over."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return 0, 0
+    if checkpoint.get("analyzer_version") != analyzer.version:
+        return 0, 0
+    return checkpoint["last_id"], checkpoint["rows"]
+
+def save_checkpoint(path, last_id, rows):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"analyzer_version": analyzer.version, "last_id": last_id, "rows": rows}, f)
+    os.replace(tmp, path)
+
+def read_chunk(db, after_id, chunk_size):
+    """Next ``chunk_size`` notes after ``after_id`` scored by another analyzer version."""
+    return db.execute(
+        select(Note.id, Note.text)
+        .filter(
+            Note.id > after_id,
+            or_(Note.analyzer_version.is_(None), Note.analyzer_version != analyzer.version),
+        )
+        .order_by(Note.id)
+        .limit(chunk_size)
+    ).all()
+
+def write_chunk(db, chunk, matrix):
+    """
+    Store the new counts of ``chunk`` and move the rollups by the difference.
+    Rows are re-read under a lock, so notes edited while their chunk was being
+    scored are skipped; the edit already stored current-version counts.
+    Returns the number of notes updated.
+    """
+    width = len(EMOTIONS)
+    scored = {
+        note_id: (text, matrix[row * width:(row + 1) * width])
+        for row, (note_id, text) in enumerate(chunk)
+    }
+    current = db.execute(
+        select(Note.id, Note.user_id, Note.created_at, Note.text, *[
+            getattr(Note, column) for column in COUNT_COLUMNS
+        ])
+        .filter(Note.id.in_(list(scored)))
+        .with_for_update()
+    ).all()
+
+    updates = []
+    deltas = defaultdict(lambda: [0] * width)
+    for note_id, user_id, created_at, text, *old_counts in current:
+        scored_text, new_counts = scored[note_id]
+        if text != scored_text:
+            continue
+        updates.append({
+            "id": note_id,
+            "analyzer_version": analyzer.version,
+            **dict(zip(COUNT_COLUMNS, new_counts)),
+        })
+        delta = deltas[(user_id, emotion_rollup_service.note_day(created_at))]
+        for i, (old, new) in enumerate(zip(old_counts, new_counts)):
+            delta[i] += new - (old or 0)
+
+    if updates:
+        db.execute(update(Note), updates)
+        emotion_rollup_service.apply_deltas_sync(db, [
+            emotion_rollup_service.delta_row(user_id, day, dict(zip(EMOTIONS, delta)))
+            for (user_id, day), delta in deltas.items()
+        ])
+        # Their dashboards changed, so their ETags must too
+        db.execute(
+            update(User)
+            .where(User.id.in_({user_id for user_id, _ in deltas}))
+            .values(data_version=User.data_version + 1)
+        )
+    return len(updates)
+
+def reanalyze_notes(chunk_size=1000, workers=None, rows_per_second=0, checkpoint=DEFAULT_CHECKPOINT):
+    """
+    Re-scores every note whose counts came from an older analyzer version.
+
+    Chunks are read in id order, scored on a process pool (up to ``workers``
+    chunks in flight) and written back in order, one transaction per chunk.
+    Progress is checkpointed after each commit, so an interrupted run resumes
+    where it stopped; rerunning a chunk is harmless because written notes no
+    longer match the version filter.
+    """
+    last_id, total = load_checkpoint(checkpoint)
+    workers = workers or os.cpu_count() or 1
+    started = time.monotonic()
+    processed = 0
+
+    db = SessionLocal()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = []
+            after_id = last_id
+            while True:
+                while len(in_flight) < workers:
+                    chunk = read_chunk(db, after_id, chunk_size)
+                    # Don't hold the read transaction open while chunks are scored
+                    db.commit()
+                    if not chunk:
+                        break
+                    after_id = chunk[-1].id
+                    texts = [text for _, text in chunk]
+                    in_flight.append((chunk, pool.submit(analyze_texts, texts)))
+                if not in_flight:
+                    break
+
+                chunk, future = in_flight.pop(0)
+                updated = write_chunk(db, chunk, future.result())
+                db.commit()
+                total += updated
+                processed += len(chunk)
+                save_checkpoint(checkpoint, chunk[-1].id, total)
+                print(f"  up to note {chunk[-1].id}: {total} notes re-scored")
+
+                if rows_per_second:
+                    # Sleep until the run is back under the target rate
+                    ahead = processed / rows_per_second - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-score notes analyzed by an older analyzer version."
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to the CPU count")
+    parser.add_argument("--rows-per-second", type=float, default=0, help="0 means unthrottled")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    print(f"Re-analyzing notes with analyzer version {analyzer.version}...")
+    total = reanalyze_notes(args.chunk_size, args.workers, args.rows_per_second, args.checkpoint)
+    print(f"Re-analysis complete! ({total} notes re-scored)")
@@ -0,0 +1,34 @@
+import argparse
+import sys
+import os
+
+# Add the root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.session import SessionLocal
+from app.db import base  # noqa: registers every model
+from app.services import emotion_rollup_service
+
+def rebuild_emotion_rollups(user_id=None):
+    """
+    Recomputes the user_daily_emotions rollup table from the notes table.
+    """
+    db = SessionLocal()
+    try:
+        rows = emotion_rollup_service.rebuild(db, user_id=user_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily emotion rollups.")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this user")
+    args = parser.parse_args()
+
+    print("Rebuilding daily emotion rollups...")
+    rows = rebuild_emotion_rollups(user_id=args.user_id)
+    print(f"Rollups rebuilt successfully! ({rows} rows)")
@@ -1,2 +1,2 @@
-from .user import User, UserCreate, Token, PlanType
-from .note import Note, NoteCreate, NoteInDBBase, NoteUpdate, DailyAnalysis,DailyEmotionSummary
+from .user import User, UserCreate, Token, PlanType, ProfilePhotoUploadRequest, ProfilePhotoUpload, ProfilePhotoComplete
+from .note import Note, NoteCreate, NoteInDBBase, NoteUpdate, NotePage, NoteSearchResult, NoteSearchPage, BulkNoteItem, BulkNoteCreate, BulkNoteResult, BulkNoteResponse, DailyAnalysis, DailyEmotionSummary, TrendBucket, EmotionTrends
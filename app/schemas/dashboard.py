@@ -14,6 +14,7 @@ class PlanType(str, Enum):
 class DashboardData(BaseModel):
     name: str
     profile_photo_url: Optional[str] = None
+    profile_thumbnail_url: Optional[str] = None
     total_notes: int
     emotion_counts: Dict[str, int]
     weekly_emotion_data: List[DailyEmotionData]
@@ -1,6 +1,6 @@
 from datetime import datetime, date
-from pydantic import BaseModel
-from typing import List, Dict
+from pydantic import BaseModel, Field
+from typing import List, Dict, Literal, Optional
 
 class NoteBase(BaseModel):
     text: str
@@ -28,6 +28,39 @@ class NoteInDBBase(NoteBase):
 class Note(NoteInDBBase):
     pass
 
+class NotePage(BaseModel):
+    items: List[Note]
+    next_cursor: Optional[str] = None
+
+class NoteSearchResult(BaseModel):
+    note: Note
+    rank: float
+    # Matching fragments of the text with hits wrapped in <mark></mark>
+    highlight: str
+
+class NoteSearchPage(BaseModel):
+    items: List[NoteSearchResult]
+    next_cursor: Optional[str] = None
+
+class BulkNoteItem(NoteBase):
+    # When the note was written on the client; defaults to the time of the sync
+    created_at: Optional[datetime] = None
+    # Retrying a sync with the same key returns the existing note
+    idempotency_key: Optional[str] = Field(None, max_length=64)
+
+class BulkNoteCreate(BaseModel):
+    notes: List[BulkNoteItem]
+
+class BulkNoteResult(BaseModel):
+    index: int
+    status: Literal["created", "duplicate"]
+    note: Note
+
+class BulkNoteResponse(BaseModel):
+    created: int
+    duplicates: int
+    results: List[BulkNoteResult]
+
 class DailyAnalysis(BaseModel):
     date: date
     total_counts: Dict[str, int]
@@ -36,6 +69,18 @@ class DailyAnalysis(BaseModel):
     class Config:
         orm_mode = True
 
+class TrendBucket(BaseModel):
+    # First local day of the day, week (Monday) or month
+    start: date
+    note_count: int
+    emotions: Dict[str, int]
+    prevalent_emotion: Optional[str] = None
+
+class EmotionTrends(BaseModel):
+    granularity: Literal["day", "week", "month"]
+    timezone: str
+    buckets: List[TrendBucket]
+
 class DailyEmotionSummary(BaseModel):
     date: date
     prevalent_emotion: str
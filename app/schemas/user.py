@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional
 
 class PlanType(str, Enum):
     lite = "lite"
@@ -11,6 +11,7 @@ class UserBase(BaseModel):
     name: Optional[str] = None
     plan: PlanType = PlanType.lite
     profile_photo_url: Optional[str] = None
+    profile_thumbnail_url: Optional[str] = None
 
 class UserCreate(UserBase):
     password: str
@@ -27,6 +28,18 @@ class User(UserBase):
     class Config:
         orm_mode = True
 
+class ProfilePhotoUploadRequest(BaseModel):
+    content_type: str
+
+class ProfilePhotoUpload(BaseModel):
+    url: str
+    fields: Dict[str, str]
+    key: str
+    expires_in: int
+
+class ProfilePhotoComplete(BaseModel):
+    key: str
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.user import PlanType
+
+class ChatBusy(Exception):
+    """A chat message was turned away because a queue it needed was full."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class _Connection:
+    def __init__(self):
+        # asyncio.Lock wakes waiters in FIFO order, which keeps replies in order
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+
+class ChatDispatcher:
+    """
+    Schedules upstream chat calls.
+
+    Each connection runs one reply at a time; later messages wait their turn,
+    at most ``max_pending_per_connection`` of them. Across connections at most
+    ``max_concurrency`` replies run at once. When a slot frees up, the plan
+    classes with waiters are served by smooth weighted round-robin (``weights``,
+    so plus gets its share ahead of lite without starving it), and users
+    within a class take turns, so a user with many connections can't crowd
+    out the rest. At most ``max_queued`` replies wait for a slot.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queued: int,
+        max_pending_per_connection: int,
+        weights: Dict[Hashable, int],
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.max_pending_per_connection = max_pending_per_connection
+        self.weights = weights
+        self.running = 0
+        self.queued = 0
+        self._connections: Dict[Hashable, _Connection] = {}
+        # Per class: user id -> that user's waiters, users in round-robin order
+        self._waiters: Dict[Hashable, "OrderedDict[Hashable, Deque[asyncio.Future]]"] = {}
+        self._current_weight: Dict[Hashable, int] = {}
+
+    @asynccontextmanager
+    async def turn(self, connection_id: Hashable, user_id: Hashable, plan: Hashable):
+        """
+        Waits for this connection's previous replies, then for a slot.
+        Raises ChatBusy("connection_queue_full") or ChatBusy("server_busy").
+        """
+        async with self.connection_turn(connection_id):
+            async with self.slot(user_id, plan):
+                yield
+
+    @asynccontextmanager
+    async def connection_turn(self, connection_id: Hashable):
+        """
+        Waits for this connection's previous replies only, for work that
+        needs no slot but must stay in order (e.g. a cached reply).
+        Raises ChatBusy("connection_queue_full").
+        """
+        connection = self._connections.get(connection_id)
+        if connection is None:
+            connection = self._connections[connection_id] = _Connection()
+        if connection.lock.locked() and connection.waiting >= self.max_pending_per_connection:
+            metrics.CHAT_REJECTED.labels("connection_queue_full").inc()
+            raise ChatBusy("connection_queue_full")
+
+        connection.waiting += 1
+        try:
+            await connection.lock.acquire()
+        except BaseException:
+            # Cancelled while queued, e.g. superseded
+            connection.waiting -= 1
+            self._forget_if_idle(connection_id, connection)
+            raise
+        connection.waiting -= 1
+        try:
+            yield
+        finally:
+            connection.lock.release()
+            self._forget_if_idle(connection_id, connection)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable, plan: Hashable):
+        """Waits for one of the ``max_concurrency`` slots. Raises ChatBusy("server_busy")."""
+        start = time.perf_counter()
+        await self._acquire(user_id, plan)
+        metrics.CHAT_QUEUE_WAIT.labels(getattr(plan, "value", plan)).observe(
+            time.perf_counter() - start
+        )
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _forget_if_idle(self, connection_id: Hashable, connection: _Connection):
+        if not connection.waiting and not connection.lock.locked():
+            if self._connections.get(connection_id) is connection:
+                del self._connections[connection_id]
+
+    async def _acquire(self, user_id: Hashable, plan: Hashable):
+        if self.running < self.max_concurrency and not self.queued:
+            self.running += 1
+            return
+        if self.queued >= self.max_queued:
+            metrics.CHAT_REJECTED.labels("server_busy").inc()
+            raise ChatBusy("server_busy")
+
+        waiter = asyncio.get_running_loop().create_future()
+        users = self._waiters.setdefault(plan, OrderedDict())
+        users.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self._remove(plan, user_id, waiter)
+            else:
+                # Granted a slot just as it was cancelled; pass it on
+                self._release()
+            raise
+
+    def _remove(self, plan: Hashable, user_id: Hashable, waiter: asyncio.Future):
+        users = self._waiters.get(plan, {})
+        waiters = users.get(user_id, ())
+        if waiter not in waiters:
+            # Already taken off by _release
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del users[user_id]
+        if not users:
+            del self._waiters[plan]
+            self._current_weight.pop(plan, None)
+        self.queued -= 1
+
+    def _next_plan(self) -> Hashable:
+        # Smooth weighted round-robin over the classes that have waiters
+        total = 0
+        chosen = None
+        for plan in self._waiters:
+            weight = self.weights.get(plan, 1)
+            total += weight
+            self._current_weight[plan] = self._current_weight.get(plan, 0) + weight
+            if chosen is None or self._current_weight[plan] > self._current_weight[chosen]:
+                chosen = plan
+        self._current_weight[chosen] -= total
+        return chosen
+
+    def _release(self):
+        self.running -= 1
+        while self.running < self.max_concurrency and self.queued:
+            plan = self._next_plan()
+            users = self._waiters[plan]
+            user_id, waiters = next(iter(users.items()))
+            waiter = waiters[0]
+            self._remove(plan, user_id, waiter)
+            if waiters:
+                # Back of the line for this user's next waiter
+                users.move_to_end(user_id)
+            if waiter.cancelled():
+                # Its task hasn't run its cleanup yet
+                continue
+            self.running += 1
+            waiter.set_result(None)
+
+dispatcher = ChatDispatcher(
+    max_concurrency=settings.CHAT_MAX_CONCURRENCY,
+    max_queued=settings.CHAT_MAX_QUEUED,
+    max_pending_per_connection=settings.CHAT_MAX_PENDING_PER_CONNECTION,
+    weights={PlanType.plus: settings.CHAT_PLUS_WEIGHT, PlanType.lite: 1},
+)
+metrics.CHAT_IN_FLIGHT.set_function(lambda: dispatcher.running)
+metrics.CHAT_QUEUED.set_function(lambda: dispatcher.queued)
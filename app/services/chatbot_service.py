@@ -2,57 +2,45 @@
 
 import os
 from openai import AsyncOpenAI
-from datetime import datetime, timedelta
-from app.db.session import SessionLocal
-from app.services import note_service
-from app.models.user import User
-import pytz  # Ensure pytz is imported
+from app.core.config import settings
+from app.services import emotion_context_cache, llm_cache
+from app.services.openai_resilience import UpstreamUnavailable, caller
+from app.services.user_cache import CurrentUser
+import asyncio
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+from app.core import metrics
 
 # Initialize the AsyncOpenAI client
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OPENAI_BASE_URL points the client at a proxy or a local stand-in. Timeouts
+# and retries are left to openai_resilience; the client timeout is a backstop.
+client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL"),
+    timeout=settings.OPENAI_DEADLINE_SECONDS,
+    max_retries=0,
+)
 
-async def get_chatbot_response(user_message: str, current_user: User) -> str:
-    # Define UTC timezone
-    utc = pytz.UTC
+MODEL = "gpt-3.5-turbo"
 
-    # Get current datetime in UTC
-    now_utc = datetime.now(utc)
-    today = now_utc.date()
+def _cache_key(user_message: str, current_user: CurrentUser, prevalent_emotion: str) -> Optional[str]:
+    if not llm_cache.enabled_for(current_user.plan):
+        return None
+    return llm_cache.make_key(MODEL, prevalent_emotion, user_message)
 
-    # Calculate start and end of the current week in UTC
-    start_of_week = today - timedelta(days=today.weekday())  # Monday
-    end_of_week = start_of_week + timedelta(days=6)  # Sunday
+async def get_cached_response(user_message: str, current_user: CurrentUser) -> Optional[str]:
+    """A stored reply to the same normalized message and emotion context, if any."""
+    if not llm_cache.enabled_for(current_user.plan):
+        return None
+    context = await emotion_context_cache.get_context(current_user.id)
+    key = _cache_key(user_message, current_user, context.prevalent_emotion)
+    return llm_cache.get(key, current_user.plan)
 
-    # Convert dates to timezone-aware datetime objects
-    start_of_week_datetime = datetime.combine(start_of_week, datetime.min.time()).replace(tzinfo=utc)
-    end_of_week_datetime = datetime.combine(end_of_week, datetime.min.time()).replace(tzinfo=utc) + timedelta(days=1)
-
-    db = SessionLocal()
-    try:
-        notes = note_service.get_notes_by_user_and_date(
-            db,
-            user_id=current_user.id,
-            start_date=start_of_week_datetime,
-            end_date=end_of_week_datetime
-        )
-    finally:
-        db.close()
-
-    # Summarize the emotions from the notes
-    total_emotion_counts = {
-        "happy": 0,
-        "calm": 0,
-        "sad": 0,
-        "upset": 0,
-    }
-
-    for note in notes:
-        total_emotion_counts["happy"] += note.happy_count
-        total_emotion_counts["calm"] += note.calm_count
-        total_emotion_counts["sad"] += note.sad_count
-        total_emotion_counts["upset"] += note.upset_count
-
-    prevalent_emotion = max(total_emotion_counts, key=total_emotion_counts.get)
+async def build_messages(user_message: str, current_user: CurrentUser) -> Tuple[List[dict], Optional[str]]:
+    """The prompt, and the reply cache key to store the answer under (None if the plan opted out)."""
+    # This week's emotions, cached per user and kept current by note writes
+    context = await emotion_context_cache.get_context(current_user.id)
+    prevalent_emotion = context.prevalent_emotion
 
     # Include the emotional summary in the prompt
     messages = [
@@ -60,13 +48,129 @@ async def get_chatbot_response(user_message: str, current_user: User) -> str:
         {"role": "assistant", "content": f"The user's prevalent emotion this week has been {prevalent_emotion}."},
         {"role": "user", "content": user_message},
     ]
+    return messages, _cache_key(user_message, current_user, prevalent_emotion)
+
+async def get_chatbot_response(user_message: str, current_user: CurrentUser) -> str:
+    messages, cache_key = await build_messages(user_message, current_user)
 
     # Call OpenAI ChatCompletion API asynchronously
-    response = await client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        max_tokens=150,
-        temperature=0.7,
-    )
-    answer = response.choices[0].message.content.strip()
+    model = MODEL
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await caller.call(lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=150,
+            temperature=0.7,
+        ))
+        outcome = "ok"
+    except UpstreamUnavailable as exc:
+        outcome = "fallback"
+        metrics.OPENAI_FALLBACKS.labels(exc.reason).inc()
+        return settings.CHAT_FALLBACK_REPLY
+    finally:
+        metrics.OPENAI_REQUEST_DURATION.labels(model, outcome).observe(time.perf_counter() - start)
+    if response.usage is not None:
+        metrics.OPENAI_TOKENS.labels(model, "prompt").inc(response.usage.prompt_tokens)
+        metrics.OPENAI_TOKENS.labels(model, "completion").inc(response.usage.completion_tokens)
+    choice = response.choices[0]
+    answer = choice.message.content.strip()
+    # A reply cut off by max_tokens or the content filter isn't worth replaying
+    if cache_key is not None and choice.finish_reason == "stop":
+        llm_cache.put(cache_key, answer)
     return answer
+
+class ChatReplyStream:
+    """
+    A streamed reply: iterate it for the text deltas, then read ``usage`` and
+    ``finish_reason``. Cancelling the iterating task or calling ``close``
+    closes the upstream HTTP response, which stops the generation.
+    """
+
+    def __init__(self, model: str, stream, started: float, cache_key: Optional[str] = None):
+        self.model = model
+        self.usage = None
+        self.finish_reason: Optional[str] = None
+        self._stream = stream
+        self._started = started
+        self._cache_key = cache_key
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        outcome = "error"
+        parts = []
+        chunks = self._stream.__aiter__()
+        try:
+            while True:
+                try:
+                    # A stalled stream counts as a failed call
+                    chunk = await asyncio.wait_for(chunks.__anext__(), settings.OPENAI_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    caller.breaker.record_failure()
+                    raise
+                if chunk.usage is not None:
+                    # Sent in a final chunk without choices
+                    self.usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    self.finish_reason = choice.finish_reason
+                if choice.delta.content:
+                    parts.append(choice.delta.content)
+                    yield choice.delta.content
+            outcome = "ok"
+            if self._cache_key is not None and self.finish_reason == "stop":
+                llm_cache.put(self._cache_key, "".join(parts).strip())
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            await self._stream.close()
+            metrics.OPENAI_REQUEST_DURATION.labels(self.model, outcome).observe(
+                time.perf_counter() - self._started
+            )
+            if self.usage is not None:
+                metrics.OPENAI_TOKENS.labels(self.model, "prompt").inc(self.usage.prompt_tokens)
+                metrics.OPENAI_TOKENS.labels(self.model, "completion").inc(self.usage.completion_tokens)
+
+    async def close(self):
+        await self._stream.close()
+
+class FallbackReplyStream:
+    """The canned reply, with ChatReplyStream's interface."""
+
+    def __init__(self, text: str):
+        self.usage = None
+        self.finish_reason = "fallback"
+        self._text = text
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        yield self._text
+
+    async def close(self):
+        pass
+
+async def stream_chatbot_response(user_message: str, current_user: CurrentUser) -> ChatReplyStream:
+    """Like ``get_chatbot_response``, but returns once the upstream stream is open."""
+    messages, cache_key = await build_messages(user_message, current_user)
+    start = time.perf_counter()
+    try:
+        stream = await caller.call(lambda: client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            max_tokens=150,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True},
+        ))
+    except UpstreamUnavailable as exc:
+        metrics.OPENAI_REQUEST_DURATION.labels(MODEL, "fallback").observe(time.perf_counter() - start)
+        metrics.OPENAI_FALLBACKS.labels(exc.reason).inc()
+        return FallbackReplyStream(settings.CHAT_FALLBACK_REPLY)
+    except Exception:
+        metrics.OPENAI_REQUEST_DURATION.labels(MODEL, "error").observe(time.perf_counter() - start)
+        raise
+    return ChatReplyStream(MODEL, stream, start, cache_key)
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+import pytz
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services import emotion_rollup_service
+from app.services.emotion_rollup_service import EMOTIONS
+
+@dataclass(frozen=True)
+class EmotionContext:
+    """A user's emotion totals for the current UTC week (Monday to Sunday)."""
+    week_start: date
+    counts: Tuple[int, ...]
+
+    @property
+    def emotion_counts(self) -> Dict[str, int]:
+        return dict(zip(EMOTIONS, self.counts))
+
+    @property
+    def prevalent_emotion(self) -> str:
+        counts = self.emotion_counts
+        return max(counts, key=counts.get)
+
+    def with_delta(self, day: date, counts: Dict[str, int]) -> "EmotionContext":
+        if not self.week_start <= day < self.week_start + timedelta(days=7):
+            return self
+        return EmotionContext(
+            self.week_start,
+            tuple(total + counts.get(emotion, 0) for emotion, total in zip(EMOTIONS, self.counts)),
+        )
+
+# Kept current by note_service writes in this process; the TTL bounds how
+# stale writes made through another worker can leave it
+context_cache = TTLCache(
+    maxsize=settings.CHAT_CONTEXT_CACHE_SIZE, ttl=settings.CHAT_CONTEXT_CACHE_TTL_SECONDS
+)
+metrics.CHAT_CONTEXT_CACHE_HITS.set_function(lambda: context_cache.hits)
+metrics.CHAT_CONTEXT_CACHE_MISSES.set_function(lambda: context_cache.misses)
+
+class _Load:
+    """A load in flight; flagged stale when a write lands before it finishes."""
+    __slots__ = ("stale",)
+
+    def __init__(self):
+        self.stale = False
+
+# Loads in flight per user, by identity; stale results may miss a write, so
+# they aren't cached
+_loads: Dict[int, Set[_Load]] = {}
+
+def current_week_start() -> date:
+    today = datetime.now(pytz.UTC).date()
+    return today - timedelta(days=today.weekday())
+
+async def _load(db: AsyncSession, user_id: int, week_start: date) -> EmotionContext:
+    rollups = await emotion_rollup_service.get_daily_rollups(
+        db, user_id=user_id, start_day=week_start, end_day=week_start + timedelta(days=6)
+    )
+    totals = emotion_rollup_service.sum_counts(rollups)
+    return EmotionContext(week_start, tuple(totals[emotion] for emotion in EMOTIONS))
+
+async def get_context(user_id: int, db: Optional[AsyncSession] = None) -> EmotionContext:
+    """
+    The user's cached context. A miss, or a context from a past week, is
+    loaded from the daily rollups on ``db`` or, if not given, a new session.
+    """
+    week_start = current_week_start()
+    context = context_cache.get(user_id)
+    if context is not None and context.week_start == week_start:
+        return context
+
+    load = _Load()
+    _loads.setdefault(user_id, set()).add(load)
+    try:
+        if db is None:
+            async with AsyncSessionLocal() as session:
+                context = await _load(session, user_id, week_start)
+        else:
+            context = await _load(db, user_id, week_start)
+    finally:
+        pending = _loads[user_id]
+        pending.discard(load)
+        if not pending:
+            del _loads[user_id]
+    if not load.stale:
+        context_cache.set(user_id, context)
+    return context
+
+def apply_delta(user_id: int, day: date, counts: Dict[str, int]) -> None:
+    """
+    Fold a committed change to the user's notes on ``day`` into their cached
+    context. Call it right after the commit, with no await in between.
+    """
+    for load in _loads.get(user_id, ()):
+        load.stale = True
+    context_cache.update(user_id, lambda context: context.with_delta(day, counts))
+
+def apply_deltas(user_id: int, rows: List[dict]) -> None:
+    """``apply_delta`` for emotion_rollup_service.delta_row rows."""
+    for row in rows:
+        apply_delta(
+            user_id, row["day"], {emotion: row[f"{emotion}_count"] for emotion in EMOTIONS}
+        )
+
+def invalidate(user_id: int) -> None:
+    context_cache.invalidate(user_id)
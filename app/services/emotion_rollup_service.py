@@ -0,0 +1,145 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models.note import Note
+from app.models.user_daily_emotion import UserDailyEmotion
+
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+import pytz
+
+EMOTIONS = ("happy", "calm", "sad", "upset")
+
+def note_day(created_at: datetime) -> date:
+    # Rollup days are UTC calendar days, like the dashboard week
+    if created_at.tzinfo is None:
+        return created_at.date()
+    return created_at.astimezone(pytz.UTC).date()
+
+def note_counts(note: Note) -> Dict[str, int]:
+    return {emotion: getattr(note, f"{emotion}_count") or 0 for emotion in EMOTIONS}
+
+def _upsert_statement(dialect: str, rows: List[dict]):
+    if dialect == "postgresql":
+        insert = postgresql.insert
+    elif dialect == "sqlite":
+        insert = sqlite.insert
+    else:
+        raise NotImplementedError(f"Emotion rollups are not supported on {dialect}")
+
+    stmt = insert(UserDailyEmotion).values(rows)
+    summed = ["note_count"] + [f"{emotion}_count" for emotion in EMOTIONS]
+    return stmt.on_conflict_do_update(
+        index_elements=[UserDailyEmotion.user_id, UserDailyEmotion.day],
+        set_={
+            column: getattr(UserDailyEmotion, column) + getattr(stmt.excluded, column)
+            for column in summed
+        },
+    )
+
+def delta_row(user_id: int, day: date, counts: Dict[str, int], note_delta: int = 0) -> dict:
+    row = {"user_id": user_id, "day": day, "note_count": note_delta}
+    row.update({f"{emotion}_count": counts.get(emotion, 0) for emotion in EMOTIONS})
+    return row
+
+def _nonzero(rows: List[dict]) -> List[dict]:
+    return [
+        row for row in rows
+        if row["note_count"] or any(row[f"{emotion}_count"] for emotion in EMOTIONS)
+    ]
+
+async def apply_deltas(db: AsyncSession, rows: List[dict]):
+    """
+    Add several ``delta_row`` rows in one statement. At most one row per
+    (user_id, day). Runs inside the caller's transaction; the caller commits.
+    """
+    rows = _nonzero(rows)
+    if rows:
+        await db.execute(_upsert_statement(db.get_bind().dialect.name, rows))
+
+def apply_deltas_sync(db: Session, rows: List[dict]):
+    """``apply_deltas`` for scripts running on a sync Session."""
+    rows = _nonzero(rows)
+    if rows:
+        db.execute(_upsert_statement(db.get_bind().dialect.name, rows))
+
+async def apply_delta(
+    db: AsyncSession,
+    user_id: int,
+    day: date,
+    counts: Dict[str, int],
+    note_delta: int = 0,
+):
+    """
+    Add ``counts`` (and ``note_delta`` notes) to the user's rollup row for ``day``.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    await apply_deltas(db, [delta_row(user_id, day, counts, note_delta)])
+
+async def get_daily_rollups(db: AsyncSession, user_id: int, start_day: date, end_day: date):
+    """Rollup rows for ``start_day`` through ``end_day`` inclusive, ordered by day."""
+    result = await db.scalars(
+        select(UserDailyEmotion).filter(
+            UserDailyEmotion.user_id == user_id,
+            UserDailyEmotion.day >= start_day,
+            UserDailyEmotion.day <= end_day,
+        ).order_by(UserDailyEmotion.day)
+    )
+    return result.all()
+
+async def get_day_rollup(db: AsyncSession, user_id: int, day: date) -> Optional[UserDailyEmotion]:
+    return await db.get(UserDailyEmotion, (user_id, day))
+
+async def count_notes(db: AsyncSession, user_id: int) -> int:
+    total = await db.scalar(
+        select(func.sum(UserDailyEmotion.note_count)).filter(
+            UserDailyEmotion.user_id == user_id
+        )
+    )
+    return total or 0
+
+def sum_counts(rollups) -> Dict[str, int]:
+    totals = {emotion: 0 for emotion in EMOTIONS}
+    for rollup in rollups:
+        for emotion in EMOTIONS:
+            totals[emotion] += getattr(rollup, f"{emotion}_count")
+    return totals
+
+def rebuild(db: Session, user_id: Optional[int] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute rollups from the notes table, for one user or everyone.
+    Returns the number of rollup rows written. The caller commits.
+    """
+    columns = [Note.user_id, Note.created_at] + [
+        getattr(Note, f"{emotion}_count") for emotion in EMOTIONS
+    ]
+    query = db.query(*columns)
+    if user_id is not None:
+        query = query.filter(Note.user_id == user_id)
+
+    totals = defaultdict(lambda: [0] * (len(EMOTIONS) + 1))
+    for note_user_id, created_at, *counts in query.yield_per(batch_size):
+        row = totals[(note_user_id, note_day(created_at))]
+        row[0] += 1
+        for i, count in enumerate(counts, start=1):
+            row[i] += count or 0
+
+    delete = db.query(UserDailyEmotion)
+    if user_id is not None:
+        delete = delete.filter(UserDailyEmotion.user_id == user_id)
+    delete.delete(synchronize_session=False)
+
+    rows = [
+        {
+            "user_id": key[0],
+            "day": key[1],
+            "note_count": row[0],
+            **{f"{emotion}_count": row[i] for i, emotion in enumerate(EMOTIONS, start=1)},
+        }
+        for key, row in totals.items()
+    ]
+    for start in range(0, len(rows), batch_size):
+        db.bulk_insert_mappings(UserDailyEmotion, rows[start:start + batch_size])
+    return len(rows)
@@ -0,0 +1,47 @@
+import hashlib
+import re
+import unicodedata
+from typing import Optional
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.user import PlanType
+
+_NOT_WORD = re.compile(r"[^\w\s]")
+
+def normalize_message(message: str) -> str:
+    """Case, accents' encoding, punctuation and spacing don't change the key."""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    return " ".join(_NOT_WORD.sub(" ", text).split())
+
+def _weigh(key: str, answer: str) -> int:
+    return len(key) + len(answer.encode())
+
+# Replies to the same normalized message under the same model and emotion
+# context, bounded by total bytes (per process)
+llm_cache = TTLCache(
+    maxsize=settings.LLM_CACHE_SIZE,
+    ttl=settings.LLM_CACHE_TTL_SECONDS,
+    maxweight=settings.LLM_CACHE_MAX_BYTES,
+    weigher=_weigh,
+)
+metrics.LLM_CACHE_BYTES.set_function(lambda: llm_cache.weight)
+
+def enabled_for(plan: PlanType) -> bool:
+    return settings.LLM_CACHE_ENABLED and getattr(plan, "value", plan) in settings.LLM_CACHE_PLANS
+
+def make_key(model: str, prevalent_emotion: str, user_message: str) -> str:
+    raw = f"{model}\n{prevalent_emotion}\n{normalize_message(user_message)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def get(key: str, plan: PlanType) -> Optional[str]:
+    answer = llm_cache.get(key)
+    metrics.LLM_CACHE_REQUESTS.labels(
+        getattr(plan, "value", plan), "hit" if answer is not None else "miss"
+    ).inc()
+    return answer
+
+def put(key: str, answer: str) -> None:
+    if answer:
+        llm_cache.set(key, answer)
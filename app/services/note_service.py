@@ -1,21 +1,51 @@
-from sqlalchemy.orm import Session
-from app.models.note import Note
-from app.schemas.note import NoteCreate, NoteUpdate
-from app.core.analysis import analyze_text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, column, func, insert, literal_column, or_, select, table, tuple_
+from sqlalchemy.exc import IntegrityError
+from app.models.note import Note, SEARCH_CONFIG, search_vector
+from app.schemas.note import BulkNoteItem, NoteCreate, NoteUpdate
+from app.core.analysis import analyzer
+from app.core.pagination import encode_cursor, decode_cursor
+from app.services import emotion_context_cache, emotion_rollup_service, user_service
 
 from datetime import datetime
-from typing import Optional
+from collections import defaultdict
+from typing import List, Optional, Tuple
 import pytz
+import re
 
-def get_note_by_id(db: Session, note_id: int):
-    return db.query(Note).filter(Note.id == note_id).first()
+# Columns of schemas.Note, for handlers that serialize rows without the ORM
+NOTE_COLUMNS = [
+    Note.id,
+    Note.text,
+    Note.created_at,
+    Note.user_id,
+    Note.happy_count,
+    Note.calm_count,
+    Note.sad_count,
+    Note.upset_count,
+]
+NOTE_KEYS = [column.key for column in NOTE_COLUMNS]
 
-def get_notes_by_user(db: Session, user_id: int):
-    return db.query(Note).filter(Note.user_id == user_id).all()
+async def get_note_by_id(db: AsyncSession, note_id: int):
+    return await db.get(Note, note_id)
 
-def create_user_note(db: Session, note_in: NoteCreate, user_id: int):
+async def get_notes_by_user(db: AsyncSession, user_id: int):
+    result = await db.scalars(select(Note).filter(Note.user_id == user_id))
+    return result.all()
 
-    emotion_counts = analyze_text(note_in.text)
+async def iter_note_rows(db: AsyncSession, user_id: int, columns, batch_size: int = 500):
+    """
+    Yield ``columns`` of every note of a user as plain tuples in id order,
+    reading ``batch_size`` rows at a time from a server-side cursor.
+    """
+    stmt = select(*columns).filter(Note.user_id == user_id).order_by(Note.id)
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for row in result:
+        yield row
+
+async def create_user_note(db: AsyncSession, note_in: NoteCreate, user_id: int):
+
+    emotion_counts = analyzer.analyze(note_in.text)
 
     note_data = note_in.dict()
     note_data.update({
@@ -24,36 +54,156 @@ def create_user_note(db: Session, note_in: NoteCreate, user_id: int):
         "calm_count": emotion_counts["calm"],
         "sad_count": emotion_counts["sad"],
         "upset_count": emotion_counts["upset"],
+        "analyzer_version": analyzer.version,
         "created_at": datetime.now(pytz.UTC),
     })
 
     note = Note(**note_data)
     db.add(note)
-    db.commit()
-    db.refresh(note)
+    day = emotion_rollup_service.note_day(note.created_at)
+    await emotion_rollup_service.apply_delta(db, user_id, day, emotion_counts, note_delta=1)
+    await user_service.bump_data_version(db, user_id)
+    await db.commit()
+    emotion_context_cache.apply_delta(user_id, day, emotion_counts)
+    await db.refresh(note)
     return note
 
-def update_user_note(db: Session, note: Note, note_in: NoteUpdate):
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return pytz.UTC.localize(value) if value else None
+    return value.astimezone(pytz.UTC)
+
+async def create_user_notes_bulk(
+    db: AsyncSession,
+    items: List[BulkNoteItem],
+    user_id: int,
+    retry_on_conflict: bool = True,
+) -> List[Tuple[str, Note]]:
+    """
+    Analyze and insert a batch of notes with one multi-row INSERT ... RETURNING
+    in a single transaction. Items whose idempotency key the user already used
+    (earlier, or earlier in this batch) are not inserted again.
+
+    Returns ("created" or "duplicate", note) for each item, in order.
+    """
+    keys = {item.idempotency_key for item in items if item.idempotency_key}
+    existing = {}
+    if keys:
+        result = await db.scalars(
+            select(Note).filter(Note.user_id == user_id, Note.idempotency_key.in_(keys))
+        )
+        existing = {note.idempotency_key: note for note in result}
+
+    pending = []
+    first_index = {}
+    for index, item in enumerate(items):
+        key = item.idempotency_key
+        if key:
+            if key in existing or key in first_index:
+                continue
+            first_index[key] = index
+        pending.append(index)
+
+    now = datetime.now(pytz.UTC)
+    texts = [items[index].text for index in pending]
+    rows = []
+    for index, counts in zip(pending, analyzer.rows(analyzer.analyze_texts(texts))):
+        item = items[index]
+        rows.append({
+            "user_id": user_id,
+            "text": item.text,
+            "created_at": _as_utc(item.created_at) or now,
+            "idempotency_key": item.idempotency_key,
+            "analyzer_version": analyzer.version,
+            **{f"{emotion}_count": count for emotion, count in counts.items()},
+        })
+
+    created = []
+    if rows:
+        try:
+            created = (await db.scalars(
+                insert(Note).returning(Note, sort_by_parameter_order=True), rows
+            )).all()
+        except IntegrityError:
+            # A concurrent retry of the same sync won the race for a key;
+            # start over so its notes come back as duplicates
+            await db.rollback()
+            if not retry_on_conflict:
+                raise
+            return await create_user_notes_bulk(db, items, user_id, retry_on_conflict=False)
+
+        deltas = defaultdict(lambda: emotion_rollup_service.delta_row(user_id, None, {}))
+        for note in created:
+            row = deltas[emotion_rollup_service.note_day(note.created_at)]
+            row["note_count"] += 1
+            for emotion, count in emotion_rollup_service.note_counts(note).items():
+                row[f"{emotion}_count"] += count
+        for day, row in deltas.items():
+            row["day"] = day
+        await emotion_rollup_service.apply_deltas(db, list(deltas.values()))
+        await user_service.bump_data_version(db, user_id)
+    await db.commit()
+    if created:
+        emotion_context_cache.apply_deltas(user_id, list(deltas.values()))
+
+    created_by_index = dict(zip(pending, created))
+    results = []
+    for index, item in enumerate(items):
+        if index in created_by_index:
+            results.append(("created", created_by_index[index]))
+        elif item.idempotency_key in existing:
+            results.append(("duplicate", existing[item.idempotency_key]))
+        else:
+            results.append(("duplicate", created_by_index[first_index[item.idempotency_key]]))
+    return results
+
+async def update_user_note(db: AsyncSession, note: Note, note_in: NoteUpdate):
+    old_text = note.text
+    old_counts = emotion_rollup_service.note_counts(note)
     for key, value in note_in.dict(exclude_unset=True).items():
         setattr(note, key, value)
-    db.commit()
-    db.refresh(note)
+
+    if note.text != old_text:
+        if analyzer.supports_incremental and note.analyzer_version == analyzer.version:
+            new_counts = analyzer.reanalyze(old_text, note.text, old_counts)
+        else:
+            # Counts from another analyzer version can't be patched by a delta
+            new_counts = analyzer.analyze(note.text)
+        for emotion, count in new_counts.items():
+            setattr(note, f"{emotion}_count", count)
+        note.analyzer_version = analyzer.version
+
+    new_counts = emotion_rollup_service.note_counts(note)
+    user_id = note.user_id
+    day = emotion_rollup_service.note_day(note.created_at)
+    delta = {emotion: new_counts[emotion] - old_counts[emotion] for emotion in new_counts}
+    await emotion_rollup_service.apply_delta(db, user_id, day, delta)
+    await user_service.bump_data_version(db, user_id)
+    await db.commit()
+    emotion_context_cache.apply_delta(user_id, day, delta)
+    await db.refresh(note)
     return note
 
-def delete_user_note(db: Session, note: Note):
-    db.delete(note)
-    db.commit()
+async def delete_user_note(db: AsyncSession, note: Note):
+    user_id = note.user_id
+    day = emotion_rollup_service.note_day(note.created_at)
+    delta = {emotion: -count for emotion, count in emotion_rollup_service.note_counts(note).items()}
+    await emotion_rollup_service.apply_delta(db, user_id, day, delta, note_delta=-1)
+    await user_service.bump_data_version(db, user_id)
+    await db.delete(note)
+    await db.commit()
+    emotion_context_cache.apply_delta(user_id, day, delta)
 
-def count_notes_by_user(db: Session, user_id: int) -> int:
-    return db.query(Note).filter(Note.user_id == user_id).count()
+async def count_notes_by_user(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(
+        select(func.count()).select_from(Note).filter(Note.user_id == user_id)
+    )
 
-def get_notes_by_user_and_date(
-    db: Session,
-    user_id: int,
+def _filter_by_date(
+    query,
     start_date: Optional[datetime],
     end_date: Optional[datetime],
 ):
-    query = db.query(Note).filter(Note.user_id == user_id)
     utc = pytz.UTC
 
     if start_date:
@@ -72,4 +222,140 @@ def get_notes_by_user_and_date(
             end_date = end_date.astimezone(utc)
         query = query.filter(Note.created_at < end_date)  # Using < for exclusivity
 
-    return query.all()
+    return query
+
+async def get_notes_by_user_and_date(
+    db: AsyncSession,
+    user_id: int,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+):
+    query = select(Note).filter(Note.user_id == user_id)
+    result = await db.scalars(_filter_by_date(query, start_date, end_date))
+    return result.all()
+
+async def get_note_rows_by_user_and_date(
+    db: AsyncSession,
+    user_id: int,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+):
+    """``NOTE_COLUMNS`` of the user's notes in the date range, as plain rows."""
+    query = select(*NOTE_COLUMNS).filter(Note.user_id == user_id)
+    query = _filter_by_date(query, start_date, end_date).order_by(Note.created_at, Note.id)
+    result = await db.execute(query)
+    return result.all()
+
+async def get_notes_page(
+    db: AsyncSession,
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    descending: bool = True,
+) -> Tuple[list, Optional[str]]:
+    """
+    One page of a user's notes ordered by (created_at, id) as ``NOTE_COLUMNS``
+    rows, plus the cursor of the next page (None on the last page).
+    Raises ValueError for a bad cursor.
+    """
+    query = _filter_by_date(
+        select(*NOTE_COLUMNS).filter(Note.user_id == user_id), start_date, end_date
+    )
+
+    sort_key = tuple_(Note.created_at, Note.id)
+    if cursor:
+        try:
+            created_at, note_id = decode_cursor(cursor)
+            after = (datetime.fromisoformat(created_at), int(note_id))
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        query = query.filter(sort_key < after if descending else sort_key > after)
+
+    if descending:
+        query = query.order_by(Note.created_at.desc(), Note.id.desc())
+    else:
+        query = query.order_by(Note.created_at.asc(), Note.id.asc())
+
+    # Fetch one extra row to learn whether another page exists
+    notes = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        last = notes[-1]
+        next_cursor = encode_cursor([last.created_at.isoformat(), last.id])
+    return notes, next_cursor
+
+HIGHLIGHT_START, HIGHLIGHT_STOP = "<mark>", "</mark>"
+
+def _postgres_search(query: str):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    vector = search_vector(Note.text)
+    rank = func.ts_rank_cd(vector, tsquery)
+    highlight = func.ts_headline(
+        SEARCH_CONFIG, Note.text, tsquery,
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2",
+    )
+    stmt = select(Note, rank.label("rank"), highlight.label("highlight")).filter(
+        vector.bool_op("@@")(tsquery)
+    )
+    return stmt, rank
+
+def _sqlite_search(query: str):
+    # Quote every word so user input can't use FTS5 query syntax; words are ANDed
+    terms = " ".join('"' + word + '"' for word in re.findall(r"\w+", query))
+    fts = table("notes_fts", column("rowid"))
+    fts_ref = literal_column("notes_fts")
+    matches = select(
+        fts.c.rowid.label("note_id"),
+        # bm25 is lower for better matches
+        (-func.bm25(fts_ref)).label("rank"),
+        func.snippet(fts_ref, 0, HIGHLIGHT_START, HIGHLIGHT_STOP, "…", 32).label("highlight"),
+    ).where(fts_ref.op("MATCH")(terms or '""')).subquery()
+    stmt = select(Note, matches.c.rank, matches.c.highlight).join(
+        matches, matches.c.note_id == Note.id
+    )
+    return stmt, matches.c.rank
+
+async def search_notes(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    emotion: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[Note, float, str]], Optional[str]]:
+    """
+    One page of a user's notes matching ``query``, best match first, as
+    (note, rank, highlight) rows, plus the cursor of the next page.
+    ``emotion`` keeps only notes with at least one keyword of that emotion.
+    Raises ValueError for a bad cursor.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt, rank = _postgres_search(query)
+    elif dialect == "sqlite":
+        stmt, rank = _sqlite_search(query)
+    else:
+        raise NotImplementedError(f"Note search is not supported on {dialect}")
+
+    stmt = stmt.filter(Note.user_id == user_id)
+    if emotion:
+        stmt = stmt.filter(getattr(Note, f"{emotion}_count") > 0)
+
+    if cursor:
+        try:
+            after_rank, after_id = decode_cursor(cursor)
+            after_rank, after_id = float(after_rank), int(after_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        stmt = stmt.filter(or_(rank < after_rank, and_(rank == after_rank, Note.id < after_id)))
+
+    rows = (await db.execute(stmt.order_by(rank.desc(), Note.id.desc()).limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_note, last_rank, _ = rows[-1]
+        next_cursor = encode_cursor([last_rank, last_note.id])
+    return [tuple(row) for row in rows], next_cursor
@@ -0,0 +1,219 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from app.core import metrics
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Worth another attempt, and a sign the upstream is unhealthy. Client errors
+# (bad request, auth) are neither.
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+class UpstreamUnavailable(Exception):
+    """The call failed fast on an open circuit, or ran out of attempts or time."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+def _error_kind(exc: BaseException) -> str:
+    if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError)):
+        return "timeout"
+    if isinstance(exc, openai.APIConnectionError):
+        return "connection"
+    if isinstance(exc, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(exc, openai.InternalServerError):
+        return "server_error"
+    return "client_error"
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and fails calls
+    fast for ``reset_seconds``. Then one probe call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                metrics.OPENAI_CIRCUIT_OPENED.inc()
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._probing = False
+
+    def release(self):
+        # A probe that ended without an outcome (e.g. cancelled) frees its turn
+        if self._state == self.HALF_OPEN:
+            self._probing = False
+
+class ResilientCaller:
+    """
+    Runs upstream calls with a per-attempt timeout inside an overall deadline,
+    retries retryable errors with full-jitter exponential backoff, and goes
+    through a circuit breaker. With ``hedge_after``, an attempt still running
+    after that many seconds gets a second, concurrent one; the first to
+    succeed wins and the other is cancelled.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        attempt_timeout: float,
+        deadline: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        hedge_after: Optional[float] = None,
+    ):
+        self.breaker = breaker
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+
+    async def call(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """Raises UpstreamUnavailable, or the error of a non-retryable failure."""
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("circuit_open")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        attempt = 0
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    result = await asyncio.wait_for(
+                        self._attempt(make_call), min(self.attempt_timeout, remaining)
+                    )
+                except RETRYABLE_ERRORS as exc:
+                    self.breaker.record_failure()
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                    if attempt >= self.max_retries or loop.time() + delay >= deadline:
+                        raise UpstreamUnavailable("failed") from exc
+                    if self.breaker.state != CircuitBreaker.CLOSED:
+                        raise UpstreamUnavailable("circuit_open") from exc
+                    metrics.OPENAI_RETRIES.labels(_error_kind(exc)).inc()
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            if probe:
+                self.breaker.release()
+
+    async def _attempt(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        if self.hedge_after is None:
+            return await self._observed(make_call)
+
+        # Both attempts are cancelled on every way out, including a timeout or
+        # cancellation of this call before the hedge is launched
+        first = asyncio.ensure_future(self._observed(make_call))
+        second = None
+        winner = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+            if done:
+                winner = first
+                return first.result()
+            metrics.OPENAI_HEDGES.labels("launched").inc()
+            second = asyncio.ensure_future(self._observed(make_call))
+            pending = {first, second}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if task is second:
+                            metrics.OPENAI_HEDGES.labels("won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            losers = [task for task in (first, second) if task is not None and task is not winner]
+            running = [task for task in losers if not task.done()]
+            for task in running:
+                task.cancel()
+            # Wait for them to unwind, so nothing outlives the call
+            await asyncio.gather(*running, return_exceptions=True)
+            for task in losers:
+                if task in running:
+                    continue
+                if not task.cancelled() and task.exception() is None:
+                    # Both finished together; don't leak the loser's open stream
+                    close = getattr(task.result(), "close", None)
+                    if close is not None:
+                        await close()
+
+    async def _observed(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        outcome = "cancelled"
+        try:
+            result = await make_call()
+            outcome = "ok"
+            return result
+        except Exception as exc:
+            outcome = _error_kind(exc)
+            raise
+        finally:
+            metrics.OPENAI_ATTEMPTS.labels(outcome).inc()
+
+_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+caller = ResilientCaller(
+    CircuitBreaker(settings.OPENAI_BREAKER_FAILURE_THRESHOLD, settings.OPENAI_BREAKER_RESET_SECONDS),
+    attempt_timeout=settings.OPENAI_TIMEOUT_SECONDS,
+    deadline=settings.OPENAI_DEADLINE_SECONDS,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    backoff_base=settings.OPENAI_RETRY_BACKOFF_SECONDS,
+    backoff_max=settings.OPENAI_RETRY_BACKOFF_MAX_SECONDS,
+    hedge_after=settings.OPENAI_HEDGE_AFTER_SECONDS,
+)
+metrics.OPENAI_CIRCUIT_STATE.set_function(lambda: _STATE_VALUES[caller.breaker.state])
@@ -0,0 +1,58 @@
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# Keys carry the user's data version, so writes never need to invalidate
+# entries; superseded versions just age out of the LRU.
+response_cache = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE, ttl=settings.RESPONSE_CACHE_TTL_SECONDS
+)
+metrics.RESPONSE_CACHE_HITS.set_function(lambda: response_cache.hits)
+metrics.RESPONSE_CACHE_MISSES.set_function(lambda: response_cache.misses)
+
+def make_etag(key: tuple) -> str:
+    digest = hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+async def conditional_json(
+    request: Request,
+    key: tuple,
+    build: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    JSON response for ``key`` with a strong ETag derived from it.
+
+    ``key`` must identify the representation completely: endpoint, user, data
+    version and any parameters. A matching If-None-Match gets a 304 and
+    ``build`` is only awaited on a response cache miss.
+    """
+    etag = make_etag(key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        metrics.NOT_MODIFIED_RESPONSES.labels(key[0]).inc()
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        # Same encoding as FastAPI's JSONResponse
+        body = json.dumps(
+            jsonable_encoder(await build()), ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        response_cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,157 @@
+from sqlalchemy import Integer, String, case, cast, func, literal, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.note import Note
+from app.services.emotion_rollup_service import EMOTIONS
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+import pytz
+
+GRANULARITIES = ("day", "week", "month")
+# A bit over a year of days
+MAX_BUCKETS = 400
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Start of the bucket containing ``day``; weeks start on Monday like date_trunc."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def local_midnight_utc(day: date, tz) -> datetime:
+    return tz.localize(datetime.combine(day, datetime.min.time())).astimezone(pytz.UTC)
+
+def _offset_minutes(tz, moment: datetime) -> int:
+    return int(moment.astimezone(tz).utcoffset().total_seconds() // 60)
+
+def utc_offset_segments(tz, start: datetime, end: datetime) -> List[Tuple[datetime, int]]:
+    """
+    The UTC offsets of ``tz`` between ``start`` and ``end`` as (until, minutes)
+    pairs: the offset is ``minutes`` for instants before ``until``. The last
+    pair runs to ``end``.
+    """
+    segments = []
+    offset = _offset_minutes(tz, start)
+    cursor = start
+    while cursor < end:
+        step = min(cursor + timedelta(days=1), end)
+        if _offset_minutes(tz, step) != offset:
+            # Narrow the change down to the minute
+            low, high = cursor, step
+            while high - low > timedelta(minutes=1):
+                mid = low + (high - low) / 2
+                if _offset_minutes(tz, mid) == offset:
+                    low = mid
+                else:
+                    high = mid
+            segments.append((high, offset))
+            offset = _offset_minutes(tz, high)
+        cursor = step
+    segments.append((end, offset))
+    return segments
+
+def _postgres_bucket(granularity: str, tz_name: str):
+    # Inlined so the SELECT and GROUP BY expressions are identical
+    local_time = func.timezone(literal(tz_name, literal_execute=True), Note.created_at)
+    return func.date_trunc(literal_column(f"'{granularity}'"), local_time)
+
+def _sqlite_bucket(granularity: str, tz, start: datetime, end: datetime):
+    # SQLite has no time zone data, so shift each note by the offset in force
+    # at its instant; the offsets are worked out in Python for the range
+    segments = utc_offset_segments(tz, start, end)
+    modifier = literal_column(f"'{segments[-1][1]:+d} minutes'")
+    if len(segments) > 1:
+        modifier = case(
+            *[
+                (Note.created_at < until, literal_column(f"'{minutes:+d} minutes'"))
+                for until, minutes in segments[:-1]
+            ],
+            else_=modifier,
+        )
+    local_time = func.datetime(Note.created_at, modifier)
+    if granularity == "week":
+        # Back to Monday: strftime('%w') is 0 for Sunday
+        days_back = (cast(func.strftime("%w", local_time), Integer) + 6) % 7
+        return func.date(local_time, literal("-") + cast(days_back, String) + literal(" days"))
+    if granularity == "month":
+        return func.strftime("%Y-%m-01", local_time)
+    return func.date(local_time)
+
+async def get_emotion_trends(
+    db: AsyncSession,
+    user_id: int,
+    granularity: str,
+    tz_name: str,
+    start_date: date,
+    end_date: date,
+) -> List[dict]:
+    """
+    Note and emotion totals per day, week or month of the user's local
+    calendar in ``tz_name``, from the bucket containing ``start_date`` through
+    the one containing ``end_date``. Buckets without notes are included as zeros.
+    Bucketing and summing run in one grouped query.
+
+    Raises ValueError for a bad range and pytz.UnknownTimeZoneError for a bad zone.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity}")
+    tz = pytz.timezone(tz_name)
+    first = bucket_start(start_date, granularity)
+    last = bucket_start(end_date, granularity)
+    if last < first:
+        raise ValueError("end_date is before start_date")
+    if (last - first).days > MAX_BUCKETS * {"day": 1, "week": 7, "month": 31}[granularity]:
+        raise ValueError(f"At most {MAX_BUCKETS} buckets per request")
+    start = local_midnight_utc(first, tz)
+    end = local_midnight_utc(next_bucket(last, granularity), tz)
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        bucket = _postgres_bucket(granularity, tz_name)
+    elif dialect == "sqlite":
+        bucket = _sqlite_bucket(granularity, tz, start, end)
+    else:
+        raise NotImplementedError(f"Trends are not supported on {dialect}")
+
+    bucket = bucket.label("bucket")
+    stmt = (
+        select(
+            bucket,
+            func.count(Note.id),
+            *[
+                func.coalesce(func.sum(getattr(Note, f"{emotion}_count")), 0)
+                for emotion in EMOTIONS
+            ],
+        )
+        .filter(Note.user_id == user_id, Note.created_at >= start, Note.created_at < end)
+        .group_by(bucket)
+    )
+    totals: Dict[date, tuple] = {}
+    for bucket_value, note_count, *counts in (await db.execute(stmt)).all():
+        if isinstance(bucket_value, str):
+            bucket_value = date.fromisoformat(bucket_value[:10])
+        elif isinstance(bucket_value, datetime):
+            bucket_value = bucket_value.date()
+        totals[bucket_value] = (note_count, counts)
+
+    buckets = []
+    current = first
+    while current <= last:
+        note_count, counts = totals.get(current, (0, [0] * len(EMOTIONS)))
+        emotions = dict(zip(EMOTIONS, counts))
+        buckets.append({
+            "start": current,
+            "note_count": note_count,
+            "emotions": emotions,
+            "prevalent_emotion": max(emotions, key=emotions.get) if note_count else None,
+        })
+        current = next_bucket(current, granularity)
+    return buckets
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.user import User, PlanType
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """The fields of the authenticated user that request handlers read."""
+    id: int
+    email: str
+    name: Optional[str]
+    plan: PlanType
+    profile_photo_url: Optional[str]
+    profile_thumbnail_url: Optional[str]
+
+    @classmethod
+    def from_orm(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            plan=user.plan,
+            profile_photo_url=user.profile_photo_url,
+            profile_thumbnail_url=user.profile_thumbnail_url,
+        )
+
+# Per process; the TTL bounds how stale another worker's copy can get
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+metrics.USER_CACHE_HITS.set_function(lambda: user_cache.hits)
+metrics.USER_CACHE_MISSES.set_function(lambda: user_cache.misses)
+
+def get_user(db: Session, user_id: int) -> Optional[CurrentUser]:
+    user = user_cache.get(user_id)
+    if user is None:
+        db_user = db.get(User, user_id)
+        if db_user is None:
+            return None
+        user = CurrentUser.from_orm(db_user)
+        user_cache.set(user_id, user)
+    return user
+
+async def get_user_async(db: AsyncSession, user_id: int) -> Optional[CurrentUser]:
+    user = user_cache.get(user_id)
+    if user is None:
+        db_user = await db.get(User, user_id)
+        if db_user is None:
+            return None
+        user = CurrentUser.from_orm(db_user)
+        user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.invalidate(user_id)
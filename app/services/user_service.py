@@ -1,28 +1,56 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 from app.schemas.user import UserCreate, PlanType
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
+from app.services.user_cache import invalidate_user
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).filter(User.email == email))
 
-def create_user(db: Session, user_in: UserCreate):
-    hashed_password = get_password_hash(user_in.password)
+async def create_user(db: AsyncSession, user_in: UserCreate):
+    hashed_password = await get_password_hash_async(user_in.password)
     user = User(email=user_in.email, hashed_password=hashed_password)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
-def update_user_plan(db: Session, user: User, plan: PlanType):
-    user.plan = plan
-    db.commit()
-    db.refresh(user)
-    return user
+async def get_data_version(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(select(User.data_version).filter(User.id == user_id)) or 0
+
+async def bump_data_version(db: AsyncSession, user_id: int):
+    """
+    Mark the user's notes or profile as changed, invalidating their ETags.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+async def update_user_password_hash(db: AsyncSession, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+    await db.commit()
 
-def update_user_profile(db: Session, user: User, update_data: dict):
+async def update_user_plan(db: AsyncSession, user, plan: PlanType):
+    # ``user`` may be a cached CurrentUser, so update the row in this session
+    db_user = await db.get(User, user.id)
+    db_user.plan = plan
+    await bump_data_version(db, db_user.id)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_user(db_user.id)
+    return db_user
+
+async def update_user_profile(db: AsyncSession, user, update_data: dict):
+    db_user = await db.get(User, user.id)
     for key, value in update_data.items():
-        setattr(user, key, value)
-    db.commit()
-    db.refresh(user)
-    return user
+        setattr(db_user, key, value)
+    await bump_data_version(db, db_user.id)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_user(db_user.id)
+    return db_user
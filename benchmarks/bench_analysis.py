@@ -0,0 +1,103 @@
+"""
+Micro-benchmark: legacy per-word keyword scan vs the compiled EmotionAnalyzer,
+and full re-scoring vs diff-aware reanalyze for small edits to long notes.
+
+    python benchmarks/bench_analysis.py [--notes 2000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import configure
+
+# app.core.analysis builds the configured engine, which reads the settings
+configure(EMOTION_ANALYZER="keyword")
+
+from app.core.analysis import EMOTION_KEYWORDS, analyzer
+
+
+def legacy_analyze_text(text: str):
+    # Verbatim copy of the original app.core.analysis.analyze_text
+    text = text.lower()
+    words = re.findall(r'\b\w+\b', text)
+    emotion_counts = {emotion: 0 for emotion in EMOTION_KEYWORDS}
+    for word in words:
+        for emotion, keywords in EMOTION_KEYWORDS.items():
+            if word in keywords:
+                emotion_counts[emotion] += 1
+    return emotion_counts
+
+
+FILLER = (
+    "today i went to work and talked with my team about the project then "
+    "walked home through the park and cooked dinner while listening to music"
+).split()
+KEYWORDS = [word for words in EMOTION_KEYWORDS.values() for word in words]
+
+
+def make_note(rng: random.Random, n_words: int) -> str:
+    words = [
+        rng.choice(KEYWORDS).capitalize() if rng.random() < 0.05 else rng.choice(FILLER)
+        for _ in range(n_words)
+    ]
+    return " ".join(words) + "."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpora = {
+        "short (~30 words)": [make_note(rng, 30) for _ in range(args.notes)],
+        "long (~2000 words)": [make_note(rng, 2000) for _ in range(args.notes // 20)],
+    }
+
+    for label, notes in corpora.items():
+        for note in notes[:50]:
+            assert legacy_analyze_text(note) == analyzer.analyze(note)
+
+        legacy = min(timeit.repeat(
+            lambda: [legacy_analyze_text(note) for note in notes], number=1, repeat=args.repeat
+        ))
+        single = min(timeit.repeat(
+            lambda: [analyzer.analyze(note) for note in notes], number=1, repeat=args.repeat
+        ))
+        batch = min(timeit.repeat(
+            lambda: analyzer.analyze_texts(notes), number=1, repeat=args.repeat
+        ))
+        print(f"{label}: {len(notes)} notes")
+        print(f"  legacy analyze_text     {legacy * 1e3:9.2f} ms")
+        print(f"  analyzer.analyze        {single * 1e3:9.2f} ms  ({legacy / single:5.1f}x)")
+        print(f"  analyzer.analyze_texts  {batch * 1e3:9.2f} ms  ({legacy / batch:5.1f}x)")
+
+    # Autosave-style edits: a few words typed somewhere in a long note
+    edits = []
+    for note in corpora["long (~2000 words)"]:
+        at = rng.randrange(len(note))
+        edited = note[:at] + " so happy today " + note[at:]
+        edits.append((note, edited, analyzer.analyze(note)))
+    for old, new, counts in edits[:50]:
+        assert analyzer.reanalyze(old, new, counts) == analyzer.analyze(new)
+
+    full = min(timeit.repeat(
+        lambda: [analyzer.analyze(new) for _, new, _ in edits], number=1, repeat=args.repeat
+    ))
+    diff = min(timeit.repeat(
+        lambda: [analyzer.reanalyze(old, new, counts) for old, new, counts in edits],
+        number=1, repeat=args.repeat,
+    ))
+    print(f"edits to long notes: {len(edits)} updates")
+    print(f"  analyzer.analyze        {full * 1e3:9.2f} ms")
+    print(f"  analyzer.reanalyze      {diff * 1e3:9.2f} ms  ({full / diff:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Simulated bursty chat load against a fixed upstream concurrency: one noisy
+user bursts messages from many connections while quiet users send one at a
+time. Compares a plain FIFO semaphore with ChatDispatcher on the quiet
+users' reply latency, per plan.
+
+    python benchmarks/bench_chat_dispatcher.py [--concurrency 8] [--noisy-connections 40]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import configure
+
+configure()
+
+from app.services.chat_dispatcher import ChatBusy, ChatDispatcher
+
+
+class FifoScheduler:
+    """What a bare semaphore around the upstream call gives."""
+
+    def __init__(self, concurrency):
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def turn(self, connection_id, user_id, plan):
+        async with self._semaphore:
+            yield
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] * 1000 if values else 0.0
+
+
+async def run(scheduler, args, seed):
+    rng = random.Random(seed)
+    latencies = {"plus": [], "lite": []}
+    rejected = 0
+
+    async def reply(connection_id, user_id, plan, record):
+        nonlocal rejected
+        start = time.perf_counter()
+        try:
+            async with scheduler.turn(connection_id, user_id, plan):
+                await asyncio.sleep(args.upstream_latency * rng.uniform(0.5, 1.5))
+        except ChatBusy:
+            rejected += 1
+            return
+        if record:
+            latencies[plan].append(time.perf_counter() - start)
+
+    async def noisy(connection):
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            # A burst per connection, without waiting for the replies
+            await asyncio.gather(*[
+                reply(f"noisy-{connection}", "noisy", "lite", False) for _ in range(args.burst)
+            ])
+
+    async def quiet(user):
+        plan = "plus" if user % 2 else "lite"
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            await reply(f"quiet-{user}", f"quiet-{user}", plan, True)
+            await asyncio.sleep(rng.uniform(0, args.upstream_latency))
+
+    await asyncio.gather(
+        *[noisy(i) for i in range(args.noisy_connections)],
+        *[quiet(i) for i in range(args.quiet_users)],
+    )
+    return latencies, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--noisy-connections", type=int, default=40)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--quiet-users", type=int, default=10)
+    parser.add_argument("--upstream-latency", type=float, default=0.05)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    schedulers = {
+        "fifo semaphore": lambda: FifoScheduler(args.concurrency),
+        "ChatDispatcher": lambda: ChatDispatcher(
+            args.concurrency, max_queued=256, max_pending_per_connection=2,
+            weights={"plus": 3, "lite": 1},
+        ),
+    }
+    print(f"quiet users' reply latency, {args.noisy_connections} noisy connections, "
+          f"{args.concurrency} upstream slots")
+    for name, make in schedulers.items():
+        latencies, rejected = asyncio.run(run(make(), args, seed=1))
+        line = f"  {name:<15}"
+        for plan, values in latencies.items():
+            line += (f"   {plan} p50 {percentile(values, 0.5):7.1f} ms"
+                     f" p99 {percentile(values, 0.99):7.1f} ms"
+                     f" ({len(values)} replies)")
+        print(line + f"   busy {rejected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Event-loop lag while Socket.IO-style handlers hit the database: the legacy
+blocking SessionLocal lookup vs the AsyncSessionLocal path.
+
+    python benchmarks/bench_event_loop_lag.py [--database-url URL] [--concurrency 50]
+
+Defaults to a throwaway SQLite file (aiosqlite for the async path); point
+--database-url at Postgres to see realistic network round trips.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import configure
+
+
+async def monitor_lag(stop: asyncio.Event, samples: list, interval: float = 0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run(label, lookup, user_ids, concurrency, rounds):
+    samples, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(stop, samples))
+
+    async def worker(offset):
+        for i in range(rounds):
+            await lookup(user_ids[(offset + i) % len(user_ids)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+    print(f"{label}: {concurrency * rounds} lookups in {elapsed:.2f}s")
+    print(f"  loop lag  mean {statistics.fmean(samples) * 1e3:7.2f} ms"
+          f"  p99 {p99 * 1e3:7.2f} ms  max {samples[-1] * 1e3:7.2f} ms"
+          f"  ({len(samples)} ticks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "bench.db"
+    )
+    configure(database_url)
+
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal, AsyncSessionLocal
+    from app.models.user import User
+
+    init_db()
+    db = SessionLocal()
+    users = [User(email=f"bench{i}@example.com", hashed_password="x") for i in range(args.users)]
+    db.add_all(users)
+    db.commit()
+    user_ids = [user.id for user in users]
+    db.close()
+
+    async def legacy_lookup(user_id):
+        # The pre-async body of main.authenticate_user
+        db = SessionLocal()
+        user = db.query(User).filter(User.id == user_id).first()
+        db.close()
+        return user
+
+    async def async_lookup(user_id):
+        async with AsyncSessionLocal() as db:
+            return await db.get(User, user_id)
+
+    asyncio.run(run("sync SessionLocal on the loop", legacy_lookup, user_ids,
+                    args.concurrency, args.rounds))
+    asyncio.run(run("AsyncSessionLocal", async_lookup, user_ids,
+                    args.concurrency, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Scaling of the phrase/negation engine on long notes: time per KB should stay
+flat from 5KB to 50KB, including adversarial text that keeps the automaton
+following failure links. The keyword engine is shown for reference.
+
+    python benchmarks/bench_phrase_engine.py [--repeat 5] [--stemming]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import configure
+
+configure()
+
+from app.core.analysis import EMOTION_KEYWORDS, EmotionAnalyzer
+from app.core.phrase_analysis import EMOTION_PHRASES, build_phrase_analyzer
+
+FILLER = (
+    "today i went to work and talked with my team about the project then "
+    "walked home through the park and cooked dinner while listening to music"
+).split()
+VOCABULARY = (
+    [word for words in EMOTION_KEYWORDS.values() for word in words]
+    + [phrase for phrases in EMOTION_PHRASES.values() for phrase in phrases]
+    + ["not", "never", "isn't", "."]
+)
+
+
+def journal_text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(VOCABULARY) if rng.random() < 0.1 else rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def adversarial_text(size: int) -> str:
+    # Long runs of phrase prefixes that almost match
+    return ("over the over the moon on cloud on cloud nine fed fed up " * (size // 50 + 1))[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stemming", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    engines = {
+        "keyword": EmotionAnalyzer(EMOTION_KEYWORDS),
+        "phrase": build_phrase_analyzer(EMOTION_KEYWORDS, stemming=args.stemming),
+    }
+    for label, make in (("journal", lambda size: journal_text(rng, size)),
+                        ("adversarial", adversarial_text)):
+        print(f"{label} text")
+        for size_kb in (5, 10, 25, 50):
+            text = make(size_kb * 1024)
+            line = f"  {size_kb:3d} KB"
+            for name, engine in engines.items():
+                seconds = min(timeit.repeat(lambda: engine.count(text), number=1, repeat=args.repeat))
+                line += f"   {name} {seconds * 1e3:7.2f} ms ({seconds * 1e6 / size_kb:6.1f} us/KB)"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+CPU cost of a 10k-note list response: ORM objects validated through
+schemas.NotePage (the previous read_notes path) vs column-projected rows
+serialized with rows_to_dicts + orjson.
+
+    python benchmarks/bench_serialization.py [--notes 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import configure
+
+
+def cpu_ms(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        function()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    configure(
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"), SLOW_QUERY_THRESHOLD_MS=60000
+    )
+
+    from sqlalchemy import insert, select
+
+    from app import schemas
+    from app.core.responses import ORJSONResponse, rows_to_dicts
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal, engine
+    from app.models.note import Note
+    from app.models.user import User
+    from app.services.note_service import NOTE_COLUMNS, NOTE_KEYS
+
+    init_db()
+    now = datetime.now(pytz.UTC)
+    with engine.begin() as conn:
+        user_id = conn.execute(
+            insert(User.__table__).values(email="bench@example.com", hashed_password="x")
+        ).inserted_primary_key[0]
+        conn.execute(insert(Note.__table__), [
+            {"user_id": user_id, "text": f"Note {i}: a calm walk, then a happy dinner.",
+             "created_at": now - timedelta(minutes=i), "happy_count": 1, "calm_count": 1,
+             "sad_count": 0, "upset_count": 0}
+            for i in range(args.notes)
+        ])
+
+    db = SessionLocal()
+
+    def legacy():
+        notes = db.query(Note).filter(Note.user_id == user_id).all()
+        if hasattr(schemas.NotePage, "model_validate"):
+            page = schemas.NotePage.model_validate(
+                {"items": notes, "next_cursor": None}, from_attributes=True
+            )
+            body = page.model_dump_json().encode()
+        else:
+            page = schemas.NotePage.parse_obj({"items": notes, "next_cursor": None})
+            body = page.json().encode()
+        db.expunge_all()
+        return body
+
+    def projected():
+        rows = db.execute(select(*NOTE_COLUMNS).filter(Note.user_id == user_id)).all()
+        return ORJSONResponse({"items": rows_to_dicts(rows, NOTE_KEYS), "next_cursor": None}).body
+
+    assert len(json.loads(legacy())["items"]) == len(json.loads(projected())["items"])
+
+    old = cpu_ms(legacy, args.repeat)
+    new = cpu_ms(projected, args.repeat)
+    print(f"{args.notes} notes per response (CPU time, best of {args.repeat})")
+    print(f"  ORM + schemas.NotePage       {old:9.2f} ms")
+    print(f"  projected rows + orjson      {new:9.2f} ms  ({old / new:5.1f}x)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
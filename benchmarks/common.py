@@ -0,0 +1,27 @@
+"""
+Setup shared by the benchmark scripts. The app reads its settings when it is
+imported, so call ``configure`` before importing anything under app/.
+"""
+import os
+from typing import Optional
+
+# Settings without a default; placeholders do unless the benchmark uses them
+REQUIRED_SETTINGS = (
+    "SQLALCHEMY_DATABASE_URI", "SECRET_KEY", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY",
+    "AWS_S3_BUCKET_NAME", "GOOGLE_CLIENT_ID", "OPENAI_API_KEY",
+)
+
+
+def configure(database_url: Optional[str] = None, placeholder: str = "benchmark", **settings) -> dict:
+    """
+    Sets SQLALCHEMY_DATABASE_URI (if given) and ``settings`` in the environment,
+    and ``placeholder`` for any other required setting not already set.
+    Returns the environment, for subprocesses running the app.
+    """
+    if database_url is not None:
+        os.environ["SQLALCHEMY_DATABASE_URI"] = database_url
+    for name, value in settings.items():
+        os.environ[name] = str(value)
+    for name in REQUIRED_SETTINGS:
+        os.environ.setdefault(name, placeholder)
+    return dict(os.environ)
@@ -0,0 +1,66 @@
+"""
+Compare two loadtest.py reports and flag regressions.
+
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 0.10]
+
+Exits with status 1 when any scenario's p95/p99 latency grows, or its
+throughput drops, by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before
+
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    rows, regressions = [], []
+    for name, base in baseline["scenarios"].items():
+        new = candidate["scenarios"].get(name)
+        if new is None:
+            continue
+        checks = [
+            ("p95_ms", base["latency_ms"]["p95"], new["latency_ms"]["p95"], 1),
+            ("p99_ms", base["latency_ms"]["p99"], new["latency_ms"]["p99"], 1),
+            ("rps", base["throughput_rps"], new["throughput_rps"], -1),
+        ]
+        for metric, before, after, direction in checks:
+            delta = change(before, after)
+            regressed = delta is not None and delta * direction > threshold
+            rows.append((name, metric, before, after, delta, regressed))
+            if regressed:
+                regressions.append(f"{name} {metric}")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Allowed relative change, e.g. 0.10 for 10%%")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'scenario':<18} {'metric':<8} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for name, metric, before, after, delta, regressed in rows:
+        shown = f"{delta:+.1%}" if delta is not None else "n/a"
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<18} {metric:<8} {before!s:>10} {after!s:>10} {shown:>8}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
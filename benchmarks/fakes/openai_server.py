@@ -0,0 +1,179 @@
+"""
+Fake OpenAI chat completions server for benchmarks and local runs.
+
+    python -m benchmarks.fakes.openai_server --port 8100 --latency 0.3 --jitter 0.1
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+
+Requests with "stream": true get server-sent events, one word per chunk
+every --token-latency seconds after the first. GET /stats reports request
+and stream counts, including streams the client abandoned.
+
+Faults: --error-rate answers with --error-status, and --slow-rate delays
+completions by --slow-latency instead. POST /faults with any of these as
+JSON keys (underscored) changes them while the server runs, e.g.
+{"error_rate": 1.0} to take the upstream down and {"error_rate": 0} to
+bring it back. {"finish_reason": "length"} ends replies as if cut off by
+max_tokens.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+REPLY = (
+    "Thanks for sharing how your week has been. It sounds like a lot has been going on; "
+    "try to set aside a few minutes today for something that helps you recharge."
+)
+
+
+def create_app(
+    latency: float = 0.2,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    token_latency: float = 0.02,
+    error_status: int = 503,
+    slow_rate: float = 0.0,
+    slow_latency: float = 5.0,
+) -> Starlette:
+    faults = {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "error_status": error_status,
+        "slow_rate": slow_rate,
+        "slow_latency": slow_latency,
+        "token_latency": token_latency,
+        "finish_reason": "stop",
+    }
+    stats = {
+        "requests": 0,
+        "errors_injected": 0,
+        "slow_injected": 0,
+        "streams_started": 0,
+        "streams_completed": 0,
+        "streams_abandoned": 0,
+    }
+
+    async def stream_events(completion_id, model, usage, include_usage):
+        stats["streams_started"] += 1
+        try:
+            words = REPLY.split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(faults["token_latency"])
+                delta = {"content": word if i == 0 else " " + word}
+                if i == 0:
+                    delta["role"] = "assistant"
+                yield _event(completion_id, model, [{"index": 0, "delta": delta, "finish_reason": None}])
+            yield _event(completion_id, model, [{"index": 0, "delta": {}, "finish_reason": faults["finish_reason"]}])
+            if include_usage:
+                yield _event(completion_id, model, [], usage)
+            yield "data: [DONE]\n\n"
+            stats["streams_completed"] += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            stats["streams_abandoned"] += 1
+            raise
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        delay = faults["latency"] + random.uniform(-faults["jitter"], faults["jitter"])
+        if faults["slow_rate"] and random.random() < faults["slow_rate"]:
+            stats["slow_injected"] += 1
+            delay = faults["slow_latency"]
+        await asyncio.sleep(max(0.0, delay))
+        if faults["error_rate"] and random.random() < faults["error_rate"]:
+            stats["errors_injected"] += 1
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "server_error"}},
+                status_code=faults["error_status"],
+            )
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+        completion_tokens = len(REPLY.split())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "gpt-3.5-turbo")
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                stream_events(completion_id, model, usage, include_usage),
+                media_type="text/event-stream",
+            )
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": REPLY},
+                "finish_reason": faults["finish_reason"],
+            }],
+            "usage": usage,
+        })
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats)
+
+    async def set_faults(request: Request):
+        changes = await request.json()
+        unknown = set(changes) - set(faults)
+        if unknown:
+            return JSONResponse({"error": f"unknown faults {sorted(unknown)}"}, status_code=400)
+        faults.update(changes)
+        return JSONResponse(faults)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", get_stats),
+        Route("/faults", set_faults, methods=["POST"]),
+    ])
+
+
+def _event(completion_id, model, choices, usage=None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+        "usage": usage,
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to the first token")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction answered with an error")
+    parser.add_argument("--error-status", type=int, default=503,
+                        help="Status of injected errors, e.g. 429 or 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="Fraction delayed by --slow-latency instead")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--token-latency", type=float, default=0.02,
+                        help="Seconds between streamed chunks")
+    args = parser.parse_args()
+    app = create_app(args.latency, args.jitter, args.error_rate, args.token_latency,
+                     args.error_status, args.slow_rate, args.slow_latency)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+End-to-end load test: boots app.main:app under uvicorn against SQLite or
+Postgres, a fake OpenAI server and moto S3, seeds synthetic users and notes,
+then drives the main read paths and Socket.IO chat concurrently.
+
+    python benchmarks/loadtest.py --users 1000 --notes 1000000 --duration 60 --output run.json
+    python benchmarks/compare.py baseline.json run.json
+
+Defaults to a throwaway SQLite file. With --database-url pointing at a local
+Postgres, --skip-seed reuses data seeded by an earlier run. Per-scenario
+p50/p95/p99 latencies (ms), throughput and error counts are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.common import configure
+
+EMAIL_PREFIX = "loadtest"
+FILLER = (
+    "today work friends coffee walk meeting family sleep rain music project dinner "
+    "morning evening weekend call class gym book train city park"
+).split()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- seeding -----------------------------------------------------------------
+
+def synthetic_text(rng: random.Random, keywords) -> str:
+    words = [
+        rng.choice(keywords) if rng.random() < 0.1 else rng.choice(FILLER)
+        for _ in range(rng.randint(10, 80))
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def seed(users: int, notes: int, days: int, batch_size: int, rng: random.Random):
+    from sqlalchemy import insert, select
+
+    from app.core.analysis import EMOTION_KEYWORDS, analyzer
+    from app.core.security import get_password_hash
+    from app.db.session import SessionLocal, engine
+    from app.models.note import Note
+    from app.models.user import User
+    from app.services import emotion_rollup_service
+
+    keywords = [word for words in EMOTION_KEYWORDS.values() for word in words]
+    hashed_password = get_password_hash("loadtest")
+
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"email": f"{EMAIL_PREFIX}{i}@example.com", "hashed_password": hashed_password,
+             "name": f"Load Test {i}", "plan": "plus" if i % 4 == 0 else "lite"}
+            for i in range(users)
+        ])
+        user_ids = conn.execute(
+            select(User.id).filter(User.email.like(f"{EMAIL_PREFIX}%"))
+        ).scalars().all()
+
+    now = datetime.now(pytz.UTC)
+    span = days * 86400
+    written = 0
+    while written < notes:
+        count = min(batch_size, notes - written)
+        texts = [synthetic_text(rng, keywords) for _ in range(count)]
+        rows = []
+        for text, counts in zip(texts, analyzer.rows(analyzer.analyze_texts(texts))):
+            rows.append({
+                "user_id": rng.choice(user_ids),
+                "text": text,
+                "created_at": now - timedelta(seconds=rng.randrange(span)),
+                **{f"{emotion}_count": value for emotion, value in counts.items()},
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Note.__table__), rows)
+        written += count
+        print(f"seeded {written}/{notes} notes", file=sys.stderr, end="\r")
+    print(file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        emotion_rollup_service.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_user_ids(limit: int):
+    from sqlalchemy import select
+
+    from app.db.session import engine
+    from app.models.user import User
+
+    with engine.connect() as conn:
+        return conn.execute(
+            select(User.id).filter(User.email.like(f"{EMAIL_PREFIX}%")).limit(limit)
+        ).scalars().all()
+
+
+# --- stand-ins and app -------------------------------------------------------
+
+def start_process(args, env):
+    return subprocess.Popen(args, cwd=ROOT, env=env)
+
+
+def wait_until_ready(url: str, timeout: float = 30.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+# --- load --------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def summary(self, duration: float) -> dict:
+        samples = sorted(self.latencies)
+
+        def percentile(q):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+
+        return {
+            "requests": len(samples),
+            "errors": self.errors,
+            "throughput_rps": round(len(samples) / duration, 2),
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(samples[-1] * 1000, 2) if samples else None,
+                "mean": round(sum(samples) / len(samples) * 1000, 2) if samples else None,
+            },
+        }
+
+
+def http_scenarios(days: int):
+    today = date.today()
+    start = (today - timedelta(days=min(days, 30))).isoformat()
+
+    async def notes_list(client, headers):
+        return await client.get("/notes/", params={"limit": 50}, headers=headers)
+
+    async def dashboard(client, headers):
+        return await client.get("/dashboard/", headers=headers)
+
+    async def emotions_summary(client, headers):
+        params = {"start_date": start, "end_date": today.isoformat()}
+        return await client.get("/notes/emotions-summary", params=params, headers=headers)
+
+    async def export(client, headers):
+        # Read the whole stream; the export is only done when the last chunk arrives
+        async with client.stream("GET", "/data/export", params={"format": "ndjson"},
+                                 headers=headers) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response
+
+    return {
+        "notes_list": notes_list,
+        "dashboard": dashboard,
+        "emotions_summary": emotions_summary,
+        "export": export,
+    }
+
+
+async def http_worker(client, request, tokens, recorder, deadline, rng):
+    while time.monotonic() < deadline:
+        headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+        start = time.perf_counter()
+        try:
+            response = await request(client, headers)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        if ok:
+            recorder.latencies.append(time.perf_counter() - start)
+        else:
+            recorder.errors += 1
+
+
+async def chat_worker(base_url, token, recorder, deadline, rng, timeout, first_chunk=None):
+    """Sends chat messages one at a time; with ``first_chunk`` they are streamed."""
+    import socketio
+
+    client = socketio.AsyncClient(reconnection=False)
+    replies = asyncio.Queue()
+    first_chunk_at = []
+    client.on("response", lambda data: replies.put_nowait(data))
+    client.on("response_done", lambda data: replies.put_nowait(data))
+    client.on("busy", lambda data: replies.put_nowait({"finish_reason": "busy"}))
+    client.on("response_chunk", lambda data: first_chunk_at or first_chunk_at.append(time.perf_counter()))
+    try:
+        await client.connect(f"{base_url}?token={token}", transports=["websocket"])
+    except Exception:
+        recorder.errors += 1
+        return
+    try:
+        while time.monotonic() < deadline and client.connected:
+            start = time.perf_counter()
+            first_chunk_at.clear()
+            message = {"message": f"I felt {rng.choice(FILLER)} today"}
+            if first_chunk is not None:
+                message["stream"] = True
+            await client.emit("message", message)
+            try:
+                reply = await asyncio.wait_for(replies.get(), timeout)
+            except asyncio.TimeoutError:
+                recorder.errors += 1
+                continue
+            if reply.get("finish_reason") in ("error", "cancelled", "busy"):
+                recorder.errors += 1
+                continue
+            recorder.latencies.append(time.perf_counter() - start)
+            if first_chunk is not None and first_chunk_at:
+                first_chunk.latencies.append(first_chunk_at[0] - start)
+    finally:
+        await client.disconnect()
+
+
+async def drive(base_url, tokens, args, rng) -> dict:
+    import httpx
+
+    recorders = {}
+    tasks = []
+    deadline = time.monotonic() + args.duration
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        for name, request in http_scenarios(args.days).items():
+            concurrency = args.export_concurrency if name == "export" else args.concurrency
+            recorders[name] = Recorder()
+            tasks += [
+                http_worker(client, request, tokens, recorders[name], deadline, rng)
+                for _ in range(concurrency)
+            ]
+        recorders["chat_message"] = Recorder()
+        first_chunk = None
+        if args.chat_stream:
+            first_chunk = recorders["chat_first_chunk"] = Recorder()
+        tasks += [
+            chat_worker(base_url, rng.choice(tokens), recorders["chat_message"], deadline, rng,
+                        args.chat_timeout, first_chunk)
+            for _ in range(args.chat_clients)
+        ]
+        start = time.monotonic()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - start
+    return {name: recorder.summary(elapsed) for name, recorder in recorders.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--notes", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=90, help="Spread notes over this many days")
+    parser.add_argument("--seed-batch", type=int, default=10000)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=10, help="Workers per HTTP scenario")
+    parser.add_argument("--export-concurrency", type=int, default=2)
+    parser.add_argument("--chat-clients", type=int, default=10)
+    parser.add_argument("--chat-timeout", type=float, default=30.0)
+    parser.add_argument("--chat-stream", action="store_true",
+                        help="Stream chat replies and also report time to the first chunk")
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--openai-jitter", type=float, default=0.1)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0,
+                        help="Fraction of upstream calls the fake answers with a 503")
+    parser.add_argument("--openai-slow-rate", type=float, default=0.0,
+                        help="Fraction of upstream calls the fake delays by --openai-slow-latency")
+    parser.add_argument("--openai-slow-latency", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    rng = random.Random(args.random_seed)
+
+    from moto.server import ThreadedMotoServer
+
+    s3_port, openai_port, app_port = free_port(), free_port(), free_port()
+    moto = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port)
+    moto.start()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "loadtest.db"
+    )
+    env = configure(
+        database_url,
+        placeholder="loadtest",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{openai_port}/v1",
+        AWS_S3_ENDPOINT_URL=f"http://127.0.0.1:{s3_port}",
+        AWS_S3_BUCKET_NAME="loadtest-bucket",
+    )
+
+    from app.core.s3 import s3_client
+    from app.core.security import create_access_token
+    from app.db.init_db import init_db
+
+    s3_client.create_bucket(
+        Bucket="loadtest-bucket",
+        CreateBucketConfiguration={"LocationConstraint": s3_client.meta.region_name},
+    )
+
+    # Also on --skip-seed, so a fresh database gets its tables and the clear
+    # "no load test users" error below instead of a crash
+    init_db()
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(args.users, args.notes, args.days, args.seed_batch, rng)
+        print(f"seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    tokens = [create_access_token(str(user_id)) for user_id in load_user_ids(args.users)]
+    if not tokens:
+        parser.error("no load test users in the database; run without --skip-seed")
+
+    processes = [
+        start_process([sys.executable, "-m", "benchmarks.fakes.openai_server",
+                       "--port", str(openai_port), "--latency", str(args.openai_latency),
+                       "--jitter", str(args.openai_jitter),
+                       "--error-rate", str(args.openai_error_rate),
+                       "--slow-rate", str(args.openai_slow_rate),
+                       "--slow-latency", str(args.openai_slow_latency)], env),
+        start_process([sys.executable, "-m", "uvicorn", "app.main:app",
+                       "--port", str(app_port), "--workers", str(args.workers),
+                       "--log-level", "warning", "--no-access-log"], env),
+    ]
+    base_url = f"http://127.0.0.1:{app_port}"
+    started_at = datetime.now(pytz.UTC).isoformat()
+    try:
+        wait_until_ready(f"{base_url}/metrics")
+        scenarios = asyncio.run(drive(base_url, tokens, args, rng))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        moto.stop()
+
+    report = {
+        "started_at": started_at,
+        "config": {
+            "database": database_url.split(":", 1)[0],
+            "users": len(tokens),
+            "notes": args.notes,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "export_concurrency": args.export_concurrency,
+            "chat_clients": args.chat_clients,
+            "chat_stream": args.chat_stream,
+            "openai_latency_s": args.openai_latency,
+            "openai_error_rate": args.openai_error_rate,
+            "openai_slow_rate": args.openai_slow_rate,
+            "workers": args.workers,
+        },
+        "scenarios": scenarios,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Settings are read at import, so configure before anything under app/ loads
+os.environ.setdefault(
+    "SQLALCHEMY_DATABASE_URI", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+)
+os.environ.setdefault("SLOW_QUERY_THRESHOLD_MS", "60000")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+for name in ("SECRET_KEY", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY",
+             "GOOGLE_CLIENT_ID", "OPENAI_API_KEY"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("AWS_S3_BUCKET_NAME", "test-bucket")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Runs an ASGI app under uvicorn on a background thread."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(10)
+
+
+def set_faults(server, **faults):
+    """Changes the faults of a running fake OpenAI server."""
+    import httpx
+
+    httpx.post(f"{server.url}/faults", json=faults).raise_for_status()
+
+
+def run_client(scenario, app=None):
+    """Runs ``scenario(client)`` with an httpx client calling the ASGI ``app`` in process."""
+    import asyncio
+
+    import httpx
+
+    if app is None:
+        from app.main import fastapi_app as app
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+async def sign_up(client, email, name="Test"):
+    """Registers and signs in a user through the API; returns auth headers."""
+    await client.post("/register", json={"email": email, "password": "pw"})
+    response = await client.post("/login", data={"username": email, "password": "pw"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    await client.put("/profile", data={"name": name}, headers=headers)
+    return headers
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from app.db.init_db import init_db
+
+    init_db()
+
+
+@pytest.fixture
+def fake_openai():
+    """The benchmarks' fake OpenAI server; its faults can be changed through POST /faults."""
+    from benchmarks.fakes.openai_server import create_app
+
+    with ServerThread(create_app(latency=0.05, token_latency=0.01)) as server:
+        yield server
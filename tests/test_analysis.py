@@ -0,0 +1,59 @@
+import random
+import re
+
+from app.core.analysis import EMOTION_KEYWORDS, EmotionAnalyzer, INCREMENTAL_MIN_LENGTH
+
+SHARED_KEYWORDS = {
+    "happy": ["happy", "moved"],
+    "calm": ["calm", "moved", "calm"],
+    "sad": ["sad", "moved", "blue"],
+    "upset": ["upset"],
+}
+
+
+def legacy_analyze_text(keywords, text):
+    # The original per-word scan
+    words = re.findall(r"\b\w+\b", text.lower())
+    counts = {emotion: 0 for emotion in keywords}
+    for word in words:
+        for emotion, emotion_keywords in keywords.items():
+            if word in emotion_keywords:
+                counts[emotion] += 1
+    return counts
+
+
+def random_text(rng, keywords, n_words=60):
+    vocabulary = [word for words in keywords.values() for word in words]
+    filler = "today i walked to work and cooked dinner with friends".split()
+    return " ".join(
+        rng.choice(vocabulary) if rng.random() < 0.3 else rng.choice(filler)
+        for _ in range(n_words)
+    )
+
+
+def test_keyword_under_several_emotions_counts_for_each():
+    analyzer = EmotionAnalyzer(SHARED_KEYWORDS)
+    assert analyzer.analyze("I was so moved, calm and a bit blue") == {
+        "happy": 1, "calm": 2, "sad": 2, "upset": 0,
+    }
+
+
+def test_matches_the_legacy_scan():
+    rng = random.Random(7)
+    for keywords in (EMOTION_KEYWORDS, SHARED_KEYWORDS):
+        analyzer = EmotionAnalyzer(keywords)
+        texts = [random_text(rng, keywords) for _ in range(50)]
+        expected = [legacy_analyze_text(keywords, text) for text in texts]
+        assert [analyzer.analyze(text) for text in texts] == expected
+        assert list(analyzer.rows(analyzer.analyze_texts(texts))) == expected
+
+
+def test_reanalyze_of_a_long_note_matches_a_full_rescore():
+    rng = random.Random(3)
+    analyzer = EmotionAnalyzer(SHARED_KEYWORDS)
+    old = random_text(rng, SHARED_KEYWORDS, n_words=INCREMENTAL_MIN_LENGTH // 4)
+    assert len(old) >= INCREMENTAL_MIN_LENGTH
+    old_counts = analyzer.analyze(old)
+    middle = len(old) // 2
+    for new in (old[:middle] + " moved " + old[middle:], old[:middle] + old[middle + 40:]):
+        assert analyzer.reanalyze(old, new, old_counts) == analyzer.analyze(new)
@@ -0,0 +1,39 @@
+from app.core.cache import TTLCache
+
+
+def make_cache(**overrides):
+    options = dict(maxsize=10, ttl=60, maxweight=10, weigher=lambda key, value: len(value))
+    options.update(overrides)
+    return TTLCache(**options)
+
+
+def test_over_weight_value_replaces_the_old_one_with_nothing():
+    cache = make_cache()
+    cache.set("key", "short")
+    cache.set("key", "much too long")
+    assert cache.get("key") is None
+    assert cache.weight == 0
+
+
+def test_weight_evicts_least_recently_used():
+    cache = make_cache()
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+    cache.set("c", "cccc")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("aaaa", None, "cccc")
+    assert cache.weight == 8
+    assert cache.evictions == 1
+
+
+def test_update_keeps_lru_position_and_weight_in_step():
+    cache = make_cache()
+    cache.set("a", "aa")
+    cache.set("b", "bb")
+    assert cache.update("a", lambda value: value * 2)
+    assert cache.weight == 6
+    cache.set("c", "cccccc")
+    # "a" was still the oldest, update didn't refresh it
+    assert cache.get("a") is None
+    assert cache.get("b") == "bb"
+    assert not cache.update("missing", lambda value: value)
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app.services.chat_dispatcher import ChatBusy, ChatDispatcher
+
+
+def make_dispatcher(**overrides):
+    options = dict(
+        max_concurrency=2, max_queued=100, max_pending_per_connection=2,
+        weights={"plus": 3, "lite": 1},
+    )
+    options.update(overrides)
+    return ChatDispatcher(**options)
+
+
+async def reply(dispatcher, connection_id, user_id="u", plan="lite", seconds=0.01, order=None):
+    async with dispatcher.turn(connection_id, user_id, plan):
+        if order is not None:
+            order.append(connection_id)
+        await asyncio.sleep(seconds)
+
+
+def test_superseded_replies_leave_no_connection_state():
+    dispatcher = make_dispatcher()
+
+    async def scenario():
+        running = asyncio.ensure_future(reply(dispatcher, "sid1", seconds=10))
+        queued = asyncio.ensure_future(reply(dispatcher, "sid1", seconds=10))
+        await asyncio.sleep(0.01)
+        # What a streamed supersede does: cancel the running and the queued reply
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert dispatcher._connections == {}
+    assert (dispatcher.running, dispatcher.queued) == (0, 0)
+
+
+def test_cancelling_only_the_queued_reply_keeps_the_connection_until_done():
+    dispatcher = make_dispatcher()
+
+    async def scenario():
+        running = asyncio.ensure_future(reply(dispatcher, "sid1", seconds=0.05))
+        queued = asyncio.ensure_future(reply(dispatcher, "sid1", seconds=10))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert "sid1" in dispatcher._connections
+        await running
+
+    asyncio.run(scenario())
+    assert dispatcher._connections == {}
+
+
+def test_connection_queue_is_bounded():
+    dispatcher = make_dispatcher(max_pending_per_connection=1)
+    outcomes = []
+
+    async def attempt(i):
+        try:
+            await reply(dispatcher, "sid1")
+            outcomes.append(i)
+        except ChatBusy as exc:
+            outcomes.append(exc.reason)
+
+    async def scenario():
+        await asyncio.gather(*[attempt(i) for i in range(3)])
+
+    asyncio.run(scenario())
+    assert sorted(map(str, outcomes)) == ["0", "1", "connection_queue_full"]
+    assert dispatcher._connections == {}
+
+
+def test_server_queue_is_bounded():
+    dispatcher = make_dispatcher(max_concurrency=1, max_queued=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(reply(dispatcher, "a", "a", seconds=0.05))
+        second = asyncio.ensure_future(reply(dispatcher, "b", "b", seconds=0.01))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ChatBusy, match="server_busy"):
+            await reply(dispatcher, "c", "c")
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert dispatcher._connections == {}
+
+
+def test_plus_is_weighted_ahead_of_lite_and_users_take_turns():
+    dispatcher = make_dispatcher(max_concurrency=1)
+    order = []
+
+    async def scenario():
+        # Holds the only slot while the others queue up
+        blocker = asyncio.ensure_future(reply(dispatcher, "blocker", "blocker", seconds=0.02))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.ensure_future(reply(dispatcher, f"noisy{i}", "noisy", "lite", 0, order))
+            for i in range(4)
+        ]
+        tasks.append(asyncio.ensure_future(reply(dispatcher, "quiet", "quiet", "lite", 0, order)))
+        tasks += [
+            asyncio.ensure_future(reply(dispatcher, f"plus{i}", f"plus{i}", "plus", 0, order))
+            for i in range(3)
+        ]
+        await asyncio.gather(blocker, *tasks)
+
+    asyncio.run(scenario())
+    assert order == ["plus0", "noisy0", "plus1", "plus2", "quiet", "noisy1", "noisy2", "noisy3"]
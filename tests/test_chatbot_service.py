@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.models.user import PlanType
+from app.services import chatbot_service, emotion_context_cache, llm_cache
+from app.services.user_cache import CurrentUser
+
+from tests.conftest import set_faults
+
+
+@pytest.fixture
+def chatbot(fake_openai, monkeypatch):
+    """chatbot_service talking to the fake server, with the reply cache on and empty."""
+    monkeypatch.setattr(
+        chatbot_service, "client",
+        AsyncOpenAI(api_key="test", base_url=f"{fake_openai.url}/v1", max_retries=0),
+    )
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_CACHE_PLANS", ["plus"])
+    llm_cache.llm_cache.clear()
+    yield fake_openai
+    llm_cache.llm_cache.clear()
+
+
+def make_user(plan=PlanType.plus, user_id=1001):
+    return CurrentUser(
+        id=user_id, email="chat@example.com", name="Chat", plan=plan,
+        profile_photo_url=None, profile_thumbnail_url=None,
+    )
+
+
+async def stream_reply(message, user):
+    reply = await chatbot_service.stream_chatbot_response(message, user)
+    return "".join([delta async for delta in reply])
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_complete_replies_are_cached(chatbot, streamed):
+    user = make_user()
+    respond = stream_reply if streamed else chatbot_service.get_chatbot_response
+
+    async def scenario():
+        answer = await respond("How was my week?", user)
+        # Case and punctuation don't change the key
+        cached = await chatbot_service.get_cached_response("how was my week", user)
+        return answer, cached
+
+    answer, cached = asyncio.run(scenario())
+    assert answer and cached == answer
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_cut_off_replies_are_not_cached(chatbot, streamed):
+    set_faults(chatbot, finish_reason="length")
+    user = make_user()
+    respond = stream_reply if streamed else chatbot_service.get_chatbot_response
+
+    async def scenario():
+        answer = await respond("How was my week?", user)
+        return answer, await chatbot_service.get_cached_response("How was my week?", user)
+
+    answer, cached = asyncio.run(scenario())
+    assert answer and cached is None
+    assert llm_cache.llm_cache.weight == 0
+
+
+def test_opted_out_plan_skips_the_context_lookup(chatbot, monkeypatch):
+    async def get_context(user_id, db=None):
+        raise AssertionError("context loaded for an opted-out plan")
+
+    monkeypatch.setattr(emotion_context_cache, "get_context", get_context)
+    user = make_user(PlanType.lite)
+    assert asyncio.run(chatbot_service.get_cached_response("How was my week?", user)) is None
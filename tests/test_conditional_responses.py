@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+from tests.conftest import run_client, sign_up
+
+TODAY = date.today().isoformat()
+SUMMARY = f"/notes/emotions-summary?start_date={TODAY}&end_date={TODAY}"
+
+
+@pytest.mark.parametrize("path", ["/dashboard/", SUMMARY])
+def test_matching_if_none_match_gets_an_empty_304(path):
+    async def scenario(client):
+        headers = await sign_up(client, f"etag-304-{len(path)}@example.com")
+        first = await client.get(path, headers=headers)
+        revalidated = await client.get(
+            path, headers={**headers, "If-None-Match": first.headers["etag"]}
+        )
+        weak = await client.get(
+            path, headers={**headers, "If-None-Match": f'"other", W/{first.headers["etag"]}'}
+        )
+        return first, revalidated, weak
+
+    first, revalidated, weak = run_client(scenario)
+
+    assert first.status_code == 200
+    assert first.content
+    for response in (revalidated, weak):
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == first.headers["etag"]
+
+
+@pytest.mark.parametrize("path", ["/dashboard/", SUMMARY])
+def test_etag_changes_when_the_data_version_does(path):
+    async def scenario(client):
+        headers = await sign_up(client, f"etag-version-{len(path)}@example.com")
+        before = await client.get(path, headers=headers)
+        unchanged = await client.get(path, headers=headers)
+        await client.post("/notes/", json={"text": "happy day"}, headers=headers)
+        after = await client.get(
+            path, headers={**headers, "If-None-Match": before.headers["etag"]}
+        )
+        return before, unchanged, after
+
+    before, unchanged, after = run_client(scenario)
+
+    assert unchanged.headers["etag"] == before.headers["etag"]
+    # The write bumped the data version, so the old ETag no longer matches
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert after.content
@@ -0,0 +1,38 @@
+import asyncio
+
+from app.services import emotion_context_cache
+from app.services.emotion_context_cache import EmotionContext, current_week_start
+
+
+def test_write_during_overlapping_loads_keeps_every_load_uncached(monkeypatch):
+    user_id = 4242
+    week_start = current_week_start()
+
+    async def scenario():
+        gates = {"first": asyncio.Event(), "second": asyncio.Event()}
+        order = iter(["first", "second"])
+
+        async def load(db, load_user_id, load_week_start):
+            await gates[next(order)].wait()
+            # Read before the write below, so this is stale once it lands
+            return EmotionContext(week_start, (0, 0, 0, 0))
+
+        monkeypatch.setattr(emotion_context_cache, "_load", load)
+        first = asyncio.ensure_future(emotion_context_cache.get_context(user_id, db=object()))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(emotion_context_cache.get_context(user_id, db=object()))
+        await asyncio.sleep(0)
+        # The later load finishes first, then a note is written mid first load
+        gates["second"].set()
+        await second
+        emotion_context_cache.apply_delta(user_id, week_start, {"happy": 1})
+        gates["first"].set()
+        await first
+
+    emotion_context_cache.invalidate(user_id)
+    asyncio.run(scenario())
+    assert user_id not in emotion_context_cache._loads
+    # The second load was cached and then got the write; the first, stale
+    # load must not have replaced it
+    assert emotion_context_cache.context_cache.get(user_id).emotion_counts["happy"] == 1
+    emotion_context_cache.invalidate(user_id)
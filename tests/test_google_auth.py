@@ -0,0 +1,129 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt as google_jwt
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.core.google_auth import GoogleCertCache
+
+from tests.conftest import ServerThread
+
+AUDIENCE = "test-client-id"
+
+
+def make_key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "stub")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(1).not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+PRIVATE_KEY, CERTIFICATE = make_key_pair()
+
+
+class StubCertEndpoint:
+    """Serves one signing certificate the way Google's certs endpoint does."""
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_control = "public, max-age=3600, must-revalidate"
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def app(self):
+        def certs(request):
+            with self._lock:
+                self.requests += 1
+            time.sleep(self.delay)
+            headers = {"Cache-Control": self.cache_control} if self.cache_control else {}
+            return JSONResponse({"stub-key": CERTIFICATE}, headers=headers)
+
+        return Starlette(routes=[Route("/certs", certs)])
+
+
+@pytest.fixture
+def stub():
+    endpoint = StubCertEndpoint()
+    with ServerThread(endpoint.app()) as server:
+        endpoint.url = f"{server.url}/certs"
+        yield endpoint
+
+
+def sign(key_id="stub-key", **claims):
+    now = int(time.time())
+    payload = {"iss": "https://accounts.google.com", "aud": AUDIENCE, "sub": "42",
+               "email": "stub@example.com", "iat": now, "exp": now + 600, **claims}
+    signer = crypt.RSASigner.from_string(PRIVATE_KEY, key_id=key_id)
+    return google_jwt.encode(signer, payload).decode()
+
+
+def test_verifies_a_token_signed_with_the_served_key(stub):
+    cache = GoogleCertCache(stub.url)
+    claims = cache.verify(sign(), audience=AUDIENCE)
+    assert (claims["sub"], claims["email"]) == ("42", "stub@example.com")
+    with pytest.raises(ValueError):
+        cache.verify(sign(), audience="another-client")
+    # Both verifications used the one fetched copy
+    assert stub.requests == 1
+
+
+def test_keeps_certificates_for_the_cache_control_max_age(stub):
+    cache = GoogleCertCache(stub.url, default_max_age=60)
+    cache.get_certs()
+    assert cache._expires_at - time.monotonic() == pytest.approx(3600, abs=5)
+
+    stub.cache_control = None
+    cache.get_certs(force_refresh=True)
+    assert cache._expires_at - time.monotonic() == pytest.approx(60, abs=5)
+
+    stub.cache_control = "public, max-age=0"
+    cache.get_certs(force_refresh=True)
+    cache.get_certs()
+    # Expired as soon as it was fetched, so the second call fetched again
+    assert stub.requests == 4
+
+
+def test_concurrent_callers_share_one_fetch_at_expiry(stub):
+    stub.delay = 0.2
+    cache = GoogleCertCache(stub.url)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(lambda _: cache.get_certs(), range(10)))
+    assert all(certs == {"stub-key": CERTIFICATE} for certs in results)
+    assert stub.requests == 1
+
+
+def test_unknown_key_ids_refetch_at_most_once_per_interval(stub):
+    cache = GoogleCertCache(stub.url, min_forced_refresh_interval=60)
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            cache.verify(sign(key_id="forged"), audience=AUDIENCE)
+    # The first load, then a single refetch for the unknown key id
+    assert stub.requests == 2
+
+
+def test_unknown_key_id_refetches_again_after_the_interval(stub):
+    cache = GoogleCertCache(stub.url, min_forced_refresh_interval=0)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            cache.verify(sign(key_id="rotated"), audience=AUDIENCE)
+    assert stub.requests == 4
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.api.api import api_router
+from app.db.instrumentation import QueryBudgetExceeded, query_budget
+from app.db.session import async_engine, engine
+
+from tests.conftest import run_client, sign_up
+
+# The routes without QueryStatsMiddleware, which would replace the budget's stats
+app = FastAPI()
+app.include_router(api_router)
+
+
+async def sign_up_with_notes(client, email):
+    headers = await sign_up(client, email)
+    for note in ("happy and calm", "a bit sad", "upset, so upset"):
+        await client.post("/notes/", json={"text": note}, headers=headers)
+    return headers
+
+
+def test_dashboard_query_budget():
+    async def scenario(client):
+        headers = await sign_up_with_notes(client, "budget-dashboard@example.com")
+        # User row, note total and the week's rollups
+        with query_budget(3, "GET /dashboard/"):
+            first = await client.get("/dashboard/", headers=headers)
+        # Unchanged since: only the user row, for its data version
+        with query_budget(1, "GET /dashboard/"):
+            second = await client.get("/dashboard/", headers=headers)
+        return first, second
+
+    first, second = run_client(scenario, app)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+
+
+def test_notes_query_budget():
+    async def scenario(client):
+        headers = await sign_up_with_notes(client, "budget-notes@example.com")
+        # One query for the page, however many notes it holds
+        with query_budget(1, "GET /notes/"):
+            return await client.get("/notes/", headers=headers)
+
+    response = run_client(scenario, app)
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 3
+
+
+def test_query_budget_fails_the_block_that_exceeds_it():
+    async def scenario(client):
+        headers = await sign_up_with_notes(client, "budget-exceeded@example.com")
+        with query_budget(0, "GET /notes/") as stats:
+            with pytest.raises(QueryBudgetExceeded, match="GET /notes/ issued 1 queries"):
+                await client.get("/notes/", headers=headers)
+        return stats
+
+    assert run_client(scenario, app).query_count == 1
+
+
+def test_failed_statement_does_not_skew_the_next_timing():
+    with engine.connect() as conn:
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.info.get("query_start_time") == []
+        with query_budget(1) as stats:
+            conn.execute(text("SELECT 1"))
+    assert stats.query_count == 1
+    assert 0 < stats.db_seconds < 1
+
+
+def test_new_connections_count_towards_connect_time():
+    async def scenario():
+        # dispose() swaps in a new pool; engine-level events carry over to it
+        await async_engine.dispose()
+        with query_budget(1) as stats:
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats.query_count == 1
+    assert stats.connect_seconds > 0
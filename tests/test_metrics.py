@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import fastapi_app
+
+
+def test_metrics_are_off_without_a_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+    response = TestClient(fastapi_app).get("/metrics", headers={"Authorization": "Bearer x"})
+    assert response.status_code == 404
+
+
+def test_metrics_require_the_configured_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    client = TestClient(fastapi_app)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
@@ -0,0 +1,25 @@
+from sqlalchemy import create_mock_engine
+
+from app.db.base_class import Base
+from app.models.note import Note
+
+
+def postgres_ddl():
+    statements = []
+    engine = create_mock_engine(
+        "postgresql://", lambda sql, *args, **kwargs: statements.append(str(sql.compile(dialect=engine.dialect)))
+    )
+    Base.metadata.create_all(engine, tables=[Note.__table__], checkfirst=False)
+    return [" ".join(statement.split()) for statement in statements]
+
+
+def test_postgres_search_index_is_scoped_by_user():
+    ddl = postgres_ddl()
+    index = next(statement for statement in ddl if "ix_notes_user_id_text_search" in statement)
+    assert index == (
+        "CREATE INDEX ix_notes_user_id_text_search ON notes "
+        "USING gin (user_id, to_tsvector('english'::regconfig, text))"
+    )
+    # btree_gin, which lets GIN index user_id, is created before the table
+    assert ddl.index("CREATE EXTENSION IF NOT EXISTS btree_gin") < ddl.index(index)
+    assert not any("notes_fts" in statement for statement in ddl)
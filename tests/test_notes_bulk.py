@@ -0,0 +1,111 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.models.note import Note
+from app.schemas.note import BulkNoteItem
+from app.services import emotion_rollup_service, note_service
+
+from tests.conftest import run_client, sign_up
+
+DAY = date(2024, 3, 4)
+WRITTEN_AT = datetime(2024, 3, 4, 12, tzinfo=timezone.utc).isoformat()
+
+
+async def rollup_totals(client, headers):
+    me = (await client.get("/users/me", headers=headers)).json()
+    async with AsyncSessionLocal() as db:
+        rollups = await emotion_rollup_service.get_daily_rollups(
+            db, user_id=me["id"], start_day=DAY, end_day=DAY
+        )
+    return [(row.note_count, row.happy_count, row.sad_count) for row in rollups]
+
+
+def test_replayed_sync_returns_the_original_notes_without_recounting():
+    notes = [
+        {"text": "happy happy", "created_at": WRITTEN_AT, "idempotency_key": "a"},
+        {"text": "so sad", "created_at": WRITTEN_AT, "idempotency_key": "b"},
+        # Repeated within the batch: stored once
+        {"text": "happy happy", "created_at": WRITTEN_AT, "idempotency_key": "a"},
+    ]
+
+    async def scenario(client):
+        headers = await sign_up(client, "bulk-replay@example.com")
+        first = (await client.post("/notes/bulk", json={"notes": notes}, headers=headers)).json()
+        after_first = await rollup_totals(client, headers)
+        replay = (await client.post("/notes/bulk", json={"notes": notes}, headers=headers)).json()
+        return first, after_first, replay, await rollup_totals(client, headers)
+
+    first, after_first, replay, after_replay = run_client(scenario)
+    assert (first["created"], first["duplicates"]) == (2, 1)
+    assert [result["status"] for result in first["results"]] == ["created", "created", "duplicate"]
+    assert first["results"][2]["note"] == first["results"][0]["note"]
+
+    assert (replay["created"], replay["duplicates"]) == (0, 3)
+    assert [result["note"] for result in replay["results"]] == [
+        result["note"] for result in first["results"]
+    ]
+    assert after_first == after_replay == [(2, 2, 1)]
+
+
+def test_too_many_notes_get_413(monkeypatch):
+    monkeypatch.setattr(settings, "NOTES_BULK_MAX_ITEMS", 2)
+
+    async def scenario(client):
+        headers = await sign_up(client, "bulk-limit@example.com")
+        notes = [{"text": f"note {i}"} for i in range(3)]
+        response = await client.post("/notes/bulk", json={"notes": notes}, headers=headers)
+        listed = await client.get("/notes/", headers=headers)
+        return response, listed.json()
+
+    response, listed = run_client(scenario)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "At most 2 notes per request"
+    assert listed["items"] == []
+
+
+class RacingAnalyzer:
+    """Lets a concurrent sync store a key between the duplicate check and the insert."""
+
+    def __init__(self, inner, user_id, key):
+        self._inner = inner
+        self._race = (user_id, key)
+        self.version = inner.version
+        self.rows = inner.rows
+
+    def analyze_texts(self, texts):
+        if self._race is not None:
+            user_id, key = self._race
+            self._race = None
+            with engine.begin() as conn:
+                conn.execute(insert(Note.__table__).values(
+                    user_id=user_id, text="from the other sync", idempotency_key=key,
+                    created_at=datetime(2024, 3, 4, 9, tzinfo=timezone.utc),
+                    happy_count=0, calm_count=0, sad_count=0, upset_count=0,
+                ))
+        return self._inner.analyze_texts(texts)
+
+
+def test_conflict_with_a_concurrent_sync_is_retried(monkeypatch):
+    async def scenario(client):
+        headers = await sign_up(client, "bulk-race@example.com")
+        user_id = (await client.get("/users/me", headers=headers)).json()["id"]
+        monkeypatch.setattr(
+            note_service, "analyzer", RacingAnalyzer(note_service.analyzer, user_id, "raced")
+        )
+        items = [
+            BulkNoteItem(text="happy", created_at=WRITTEN_AT, idempotency_key="raced"),
+            BulkNoteItem(text="sad", created_at=WRITTEN_AT, idempotency_key="fresh"),
+        ]
+        async with AsyncSessionLocal() as db:
+            results = await note_service.create_user_notes_bulk(db, items, user_id)
+        return results, await rollup_totals(client, headers)
+
+    results, rollups = run_client(scenario)
+    assert [status for status, _ in results] == ["duplicate", "created"]
+    assert results[0][1].text == "from the other sync"
+    assert results[1][1].text == "sad"
+    # Only the note this sync created was rolled up
+    assert rollups == [(1, 0, 1)]
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+from openai import AsyncOpenAI
+
+from app.services.openai_resilience import CircuitBreaker, ResilientCaller, UpstreamUnavailable
+
+from tests.conftest import set_faults
+
+
+def make_caller(**overrides):
+    options = dict(
+        attempt_timeout=2.0, deadline=5.0, max_retries=0,
+        backoff_base=0.01, backoff_max=0.01, hedge_after=0.2,
+    )
+    options.update(overrides)
+    return ResilientCaller(CircuitBreaker(failure_threshold=100, reset_seconds=30), **options)
+
+
+class Upstream:
+    """Calls the fake server's completions endpoint and tracks calls still running."""
+
+    def __init__(self, url):
+        self.url = url
+        self.running = 0
+        self.started = 0
+
+    async def __call__(self):
+        self.running += 1
+        self.started += 1
+        try:
+            async with AsyncOpenAI(api_key="test", base_url=f"{self.url}/v1", max_retries=0) as client:
+                return await client.chat.completions.create(
+                    model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}]
+                )
+        finally:
+            self.running -= 1
+
+
+def test_cancelling_before_the_hedge_cancels_the_first_attempt(fake_openai):
+    set_faults(fake_openai, slow_rate=1.0, slow_latency=2.0)
+    upstream = Upstream(fake_openai.url)
+    caller = make_caller()
+
+    async def scenario():
+        call = asyncio.ensure_future(caller.call(upstream))
+        await asyncio.sleep(0.1)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        return upstream.running
+
+    assert asyncio.run(scenario()) == 0
+    assert upstream.started == 1
+
+
+def test_attempt_timeouts_before_the_hedge_leave_nothing_running(fake_openai):
+    set_faults(fake_openai, slow_rate=1.0, slow_latency=2.0)
+    upstream = Upstream(fake_openai.url)
+    caller = make_caller(attempt_timeout=0.1, max_retries=3)
+
+    async def scenario():
+        with pytest.raises(UpstreamUnavailable):
+            await caller.call(upstream)
+        return upstream.running
+
+    assert asyncio.run(scenario()) == 0
+    assert upstream.started == 4
+
+
+def test_hedge_wins_over_a_slow_first_attempt(fake_openai):
+    set_faults(fake_openai, slow_rate=1.0, slow_latency=2.0)
+    upstream = Upstream(fake_openai.url)
+    caller = make_caller()
+
+    async def scenario():
+        call = asyncio.ensure_future(caller.call(upstream))
+        await asyncio.sleep(0.1)
+        # The first request is already slow; the hedge won't be
+        await asyncio.to_thread(set_faults, fake_openai, slow_rate=0.0)
+        start = time.perf_counter()
+        result = await call
+        return result, time.perf_counter() - start, upstream.running
+
+    result, elapsed, running = asyncio.run(scenario())
+    assert result.choices[0].message.content
+    assert elapsed < 1.0
+    assert running == 0
+    assert upstream.started == 2
+
+
+def test_open_circuit_fails_fast_without_calling_upstream(fake_openai):
+    set_faults(fake_openai, error_rate=1.0)
+    upstream = Upstream(fake_openai.url)
+    caller = ResilientCaller(
+        CircuitBreaker(failure_threshold=2, reset_seconds=30),
+        attempt_timeout=1.0, deadline=5.0, max_retries=1, backoff_base=0.01, backoff_max=0.01,
+    )
+
+    async def call():
+        return await caller.call(upstream)
+
+    with pytest.raises(UpstreamUnavailable, match="failed"):
+        asyncio.run(call())
+    assert upstream.started == 2
+    assert caller.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable, match="circuit_open"):
+        asyncio.run(call())
+    assert upstream.started == 2
@@ -0,0 +1,44 @@
+from app.core.phrase_analysis import PhraseAnalyzer
+
+KEYWORDS = {"happy": ["happy"], "calm": ["calm"], "sad": ["sad"], "upset": ["angry"]}
+PHRASES = {"happy": ["made my day"], "calm": [], "sad": ["let down"], "upset": []}
+
+
+def make_analyzer():
+    return PhraseAnalyzer(KEYWORDS, PHRASES)
+
+
+def test_negation_with_typographic_apostrophes():
+    analyzer = make_analyzer()
+    for text in ("I isn't happy", "I isn’t happy", "I isn‘t happy", "I don’t feel sad"):
+        assert analyzer.analyze(text) == {"happy": 0, "calm": 0, "sad": 0, "upset": 0}, text
+
+
+def test_typographic_apostrophes_in_the_lexicon():
+    analyzer = PhraseAnalyzer({"happy": ["life’s good"]}, {})
+    assert analyzer.analyze("honestly life's good") == {"happy": 1}
+    assert analyzer.analyze("honestly life’s good") == {"happy": 1}
+
+
+def test_negation_stops_at_a_clause_break():
+    analyzer = make_analyzer()
+    assert analyzer.analyze("Not today. I am happy, it made my day") == {
+        "happy": 2, "calm": 0, "sad": 0, "upset": 0,
+    }
+
+
+def test_entry_under_several_emotions_counts_for_each():
+    keywords = {"happy": ["moved"], "calm": ["calm"], "sad": ["moved"], "upset": []}
+    phrases = {"happy": ["in tears"], "calm": [], "sad": ["in tears"], "upset": []}
+    analyzer = PhraseAnalyzer(keywords, phrases)
+    assert analyzer.analyze("so moved, in tears. Not moved at all") == {
+        "happy": 2, "calm": 0, "sad": 2, "upset": 0,
+    }
+
+
+def test_counts_match_the_keyword_engine_on_single_words():
+    from app.core.analysis import EmotionAnalyzer
+
+    keywords = {"happy": ["happy", "moved"], "calm": ["calm", "moved"], "sad": ["sad"], "upset": []}
+    text = "moved and happy, calm then sad and moved again"
+    assert PhraseAnalyzer(keywords, {}).analyze(text) == EmotionAnalyzer(keywords).analyze(text)
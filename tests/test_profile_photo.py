@@ -0,0 +1,117 @@
+import io
+import sys
+
+import boto3
+import httpx
+import pytest
+from moto.server import ThreadedMotoServer
+from PIL import Image
+
+from app.core import s3
+from app.core.config import settings
+
+from tests.conftest import free_port, run_client, sign_up
+
+
+@pytest.fixture(scope="module")
+def moto_server():
+    port = free_port()
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def bucket(moto_server, monkeypatch):
+    """Points app.core.s3 at a moto server with an empty bucket."""
+    client = boto3.client(
+        "s3", aws_access_key_id="test", aws_secret_access_key="test",
+        region_name="us-east-1", endpoint_url=moto_server,
+    )
+    client.create_bucket(Bucket=settings.AWS_S3_BUCKET_NAME)
+    monkeypatch.setattr(s3, "s3_client", client)
+    monkeypatch.setattr(settings, "AWS_S3_ENDPOINT_URL", moto_server)
+    yield client
+    for item in client.list_objects_v2(Bucket=settings.AWS_S3_BUCKET_NAME).get("Contents", []):
+        client.delete_object(Bucket=settings.AWS_S3_BUCKET_NAME, Key=item["Key"])
+    client.delete_bucket(Bucket=settings.AWS_S3_BUCKET_NAME)
+
+
+def png(width=300, height=200) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "teal").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def upload_photo(client, headers, content_type="image/png", data=None):
+    response = await client.post(
+        "/profile/photo/upload-url", json={"content_type": content_type}, headers=headers
+    )
+    assert response.status_code == 200
+    upload = response.json()
+    posted = httpx.post(
+        upload["url"], data=upload["fields"], files={"file": ("photo", data or png(), content_type)}
+    )
+    assert posted.status_code in (200, 204)
+    return upload["key"]
+
+
+def test_presign_complete_and_thumbnail(bucket):
+    async def scenario(client):
+        headers = await sign_up(client, "photo@example.com")
+        key = await upload_photo(client, headers)
+        # The thumbnail is made in a background task, done before the response returns here
+        completed = await client.post("/profile/photo/complete", json={"key": key}, headers=headers)
+        me = await client.get("/users/me", headers=headers)
+        return key, completed, me.json()
+
+    key, completed, me = run_client(scenario)
+    assert completed.status_code == 200
+    assert key.startswith("profile-photos/")
+    assert me["profile_photo_url"] == f"{settings.AWS_S3_ENDPOINT_URL}/{settings.AWS_S3_BUCKET_NAME}/{key}"
+    thumbnail_key = key.rsplit(".", 1)[0] + f"_{settings.PROFILE_THUMBNAIL_SIZE}.jpg"
+    assert me["profile_thumbnail_url"].endswith(thumbnail_key)
+
+    thumbnail = bucket.get_object(Bucket=settings.AWS_S3_BUCKET_NAME, Key=thumbnail_key)
+    assert thumbnail["ContentType"] == "image/jpeg"
+    with Image.open(io.BytesIO(thumbnail["Body"].read())) as image:
+        assert max(image.size) == settings.PROFILE_THUMBNAIL_SIZE
+
+
+def test_complete_rejects_foreign_and_missing_keys(bucket):
+    async def scenario(client):
+        owner = await sign_up(client, "photo-owner@example.com")
+        other = await sign_up(client, "photo-other@example.com")
+        key = await upload_photo(client, owner)
+        foreign = await client.post("/profile/photo/complete", json={"key": key}, headers=other)
+        missing = await client.post(
+            "/profile/photo/complete", json={"key": key + ".missing"}, headers=owner
+        )
+        unsupported = await client.post(
+            "/profile/photo/upload-url", json={"content_type": "image/gif"}, headers=owner
+        )
+        return foreign, missing, unsupported
+
+    foreign, missing, unsupported = run_client(scenario)
+    assert (foreign.status_code, foreign.json()["detail"]) == (400, "Invalid upload key")
+    assert (missing.status_code, missing.json()["detail"]) == (400, "Upload not found")
+    assert (unsupported.status_code, unsupported.json()["detail"]) == (400, "Unsupported content type")
+
+
+def test_photo_is_kept_without_a_thumbnail_when_pillow_is_missing(bucket, monkeypatch):
+    photo = png()
+    # None in sys.modules makes "from PIL import Image" raise ImportError
+    monkeypatch.setitem(sys.modules, "PIL", None)
+
+    async def scenario(client):
+        headers = await sign_up(client, "photo-no-pillow@example.com")
+        key = await upload_photo(client, headers, data=photo)
+        completed = await client.post("/profile/photo/complete", json={"key": key}, headers=headers)
+        return key, completed
+
+    key, completed = run_client(scenario)
+    assert completed.status_code == 200
+    assert completed.json()["profile_photo_url"].endswith(key)
+    keys = [item["Key"] for item in bucket.list_objects_v2(Bucket=settings.AWS_S3_BUCKET_NAME)["Contents"]]
+    assert keys == [key]
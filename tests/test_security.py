@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.security import PasswordHashPool, PasswordHasherBusy
+
+
+def test_cancelled_callers_keep_their_slot_until_the_hash_ends():
+    pool = PasswordHashPool(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        # A client gives up on the running hash; its bcrypt job still runs
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        assert pool.stats()["pending"] == 2
+        with pytest.raises(PasswordHasherBusy):
+            await pool.run(release.wait)
+
+        release.set()
+        assert await queued is True
+        return await pool.run(lambda: "done")
+
+    try:
+        assert asyncio.run(scenario()) == "done"
+    finally:
+        # Never leave a worker blocked, even when an assertion failed
+        release.set()
+    assert pool.stats()["pending"] == 0
+    assert pool.stats()["rejected"] == 1
+
+
+def test_job_cancelled_before_it_starts_frees_its_slot():
+    pool = PasswordHashPool(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        # Cancelled in the executor's queue, so it never runs
+        assert pool.stats()["pending"] == 1
+        release.set()
+        await running
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+    assert pool.stats()["pending"] == 0
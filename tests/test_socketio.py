@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import time
+
+import httpx
+import pytest
+import socketio
+from openai import AsyncOpenAI
+
+from app import main
+from app.core.security import create_access_token
+from app.db.session import AsyncSessionLocal
+from app.schemas.user import UserCreate
+from app.core.config import settings
+from app.services import chatbot_service, emotion_context_cache, llm_cache, user_service
+from app.services.chat_dispatcher import dispatcher as chat_dispatcher
+from benchmarks.fakes.openai_server import REPLY
+
+from tests.conftest import ServerThread, set_faults
+
+
+async def create_user(email):
+    async with AsyncSessionLocal() as db:
+        user = await user_service.create_user(db, UserCreate(email=email, password="pw"))
+    return user, create_access_token(str(user.id))
+
+
+def test_connect_survives_a_failed_context_warm_up(monkeypatch):
+    disconnected = []
+
+    async def get_context(user_id, db=None):
+        raise ConnectionError("database unavailable")
+
+    async def disconnect(sid):
+        disconnected.append(sid)
+
+    monkeypatch.setattr(emotion_context_cache, "get_context", get_context)
+    monkeypatch.setattr(main.sio, "disconnect", disconnect)
+
+    async def scenario():
+        user, token = await create_user("warm-up@example.com")
+        environ = {"asgi.scope": {"query_string": f"token={token}".encode()}}
+        await main.connect("warm-up-sid", environ)
+        return user
+
+    user = asyncio.run(scenario())
+    try:
+        assert main.connected_users["warm-up-sid"].id == user.id
+        assert disconnected == []
+    finally:
+        main.connected_users.pop("warm-up-sid", None)
+
+
+@pytest.fixture
+def chat_server(fake_openai, monkeypatch):
+    """The app under uvicorn, its chatbot talking to the fake OpenAI server."""
+    monkeypatch.setattr(
+        chatbot_service, "client",
+        AsyncOpenAI(api_key="test", base_url=f"{fake_openai.url}/v1", max_retries=0),
+    )
+    with ServerThread(main.app) as server:
+        yield server
+
+
+class ChatClient:
+    """Socket.IO client that records the chat events it receives, in order."""
+
+    def __init__(self):
+        self.sio = socketio.AsyncClient()
+        self.events = []
+        self.done = asyncio.Queue()
+        for name in ("response_chunk", "response_done", "busy"):
+            self.sio.on(name, functools.partial(self._record, name))
+
+    async def _record(self, name, data):
+        self.events.append((name, data))
+        if name == "response_done":
+            self.done.put_nowait(data)
+
+    async def connect(self, server, token):
+        await self.sio.connect(f"{server.url}?token={token}", transports=["websocket"])
+
+    def chunks(self, reply_id):
+        return [data["delta"] for name, data in self.events
+                if name == "response_chunk" and data["id"] == reply_id]
+
+    async def first_chunk(self, reply_id):
+        while not self.chunks(reply_id):
+            await asyncio.sleep(0.01)
+
+    async def wait_done(self, timeout=10):
+        return await asyncio.wait_for(self.done.get(), timeout)
+
+
+async def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+def upstream_stats(server):
+    return httpx.get(f"{server.url}/stats").json()
+
+
+def test_streamed_reply_chunks_in_order_then_done_with_usage(chat_server, fake_openai):
+    _, token = asyncio.run(create_user("stream@example.com"))
+
+    async def scenario():
+        client = ChatClient()
+        await client.connect(chat_server, token)
+        await client.sio.emit("message", {"message": "How was my week?", "stream": True, "id": "r1"})
+        done = await client.wait_done()
+        await client.sio.disconnect()
+        return client, done
+
+    client, done = asyncio.run(scenario())
+    chunks = client.chunks("r1")
+    assert "".join(chunks) == REPLY
+    assert len(chunks) == len(REPLY.split())
+    # Every chunk comes before response_done
+    assert [name for name, _ in client.events] == ["response_chunk"] * len(chunks) + ["response_done"]
+    assert done["id"] == "r1"
+    assert done["message"] == REPLY
+    assert done["finish_reason"] == "stop"
+    assert done["cached"] is False
+    assert done["usage"]["completion_tokens"] == len(REPLY.split())
+    assert done["usage"]["total_tokens"] == done["usage"]["prompt_tokens"] + len(REPLY.split())
+
+
+def test_new_message_cancels_the_streaming_reply(chat_server, fake_openai):
+    set_faults(fake_openai, token_latency=0.05)
+    _, token = asyncio.run(create_user("supersede@example.com"))
+
+    async def scenario():
+        client = ChatClient()
+        await client.connect(chat_server, token)
+        await client.sio.emit("message", {"message": "first", "stream": True, "id": "old"})
+        await client.first_chunk("old")
+        await client.sio.emit("message", {"message": "second", "stream": True, "id": "new"})
+        superseded = await client.wait_done()
+        finished = await client.wait_done()
+        await client.sio.disconnect()
+        return client, superseded, finished
+
+    client, superseded, finished = asyncio.run(scenario())
+    assert (superseded["id"], superseded["finish_reason"]) == ("old", "cancelled")
+    assert superseded["message"] == "".join(client.chunks("old")).strip()
+    assert len(client.chunks("old")) < len(REPLY.split())
+    assert (finished["id"], finished["finish_reason"]) == ("new", "stop")
+    assert "".join(client.chunks("new")) == REPLY
+    # The cancelled reply closed its upstream stream
+    assert upstream_stats(fake_openai)["streams_abandoned"] == 1
+
+
+def test_disconnect_cancels_the_streaming_reply(chat_server, fake_openai):
+    set_faults(fake_openai, token_latency=0.05)
+    user, token = asyncio.run(create_user("leave@example.com"))
+
+    async def scenario():
+        client = ChatClient()
+        await client.connect(chat_server, token)
+        await client.sio.emit("message", {"message": "hello", "stream": True, "id": "r1"})
+        await client.first_chunk("r1")
+        sid = next(sid for sid, connected in main.connected_users.items() if connected.id == user.id)
+        await client.sio.disconnect()
+        await wait_for(lambda: upstream_stats(fake_openai)["streams_abandoned"] == 1)
+        await wait_for(lambda: sid not in main.reply_tasks and sid not in chat_dispatcher._connections)
+        return client
+
+    client = asyncio.run(scenario())
+    assert len(client.chunks("r1")) < len(REPLY.split())
+    assert upstream_stats(fake_openai)["streams_completed"] == 0
+
+
+def test_cached_plain_reply_waits_for_the_reply_ahead_of_it(chat_server, fake_openai, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_CACHE_PLANS", ["lite"])
+    set_faults(fake_openai, latency=0.3)
+    user, token = asyncio.run(create_user("in-order@example.com"))
+
+    async def scenario():
+        context = await emotion_context_cache.get_context(user.id)
+        key = llm_cache.make_key(chatbot_service.MODEL, context.prevalent_emotion, "cached question")
+        llm_cache.put(key, "cached answer")
+
+        replies = asyncio.Queue()
+        client = socketio.AsyncClient()
+        client.on("response", replies.put_nowait)
+        await client.connect(f"{chat_server.url}?token={token}", transports=["websocket"])
+        await client.emit("message", {"message": "slow question", "id": "slow"})
+        await client.emit("message", {"message": "cached question", "id": "cached"})
+        received = [await asyncio.wait_for(replies.get(), 10) for _ in range(2)]
+        await client.disconnect()
+        return received
+
+    try:
+        first, second = asyncio.run(scenario())
+    finally:
+        llm_cache.llm_cache.clear()
+    assert (first["id"], first["message"]) == ("slow", REPLY)
+    assert (second["id"], second["message"]) == ("cached", "cached answer")